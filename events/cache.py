@@ -0,0 +1,109 @@
+"""
+Process-local caches shared by the event processors
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+_missing = object()
+
+
+class CachedFailure(object):
+    """
+    Negative cache entry holding the exception raised by a failed load
+    """
+    def __init__(self, err):
+        self.err = err
+
+
+class TTLCache(object):
+    """
+    Bounded LRU cache with per-entry expiry and hit/miss counters
+
+    Loads that raise are cached for failure_ttl seconds and the
+    original exception is re-raised on subsequent hits.  A
+    failure_ttl of zero disables negative caching.
+    """
+    def __init__(self, ttl=300, max_size=128, failure_ttl=0):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._failure_ttl = failure_ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                (expires, value) = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires <= time():
+                self.misses += 1
+                return default
+
+            self._entries[key] = (expires, value)
+            self.hits += 1
+
+        if isinstance(value, CachedFailure):
+            raise value.err
+
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time() + (self._ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def set_failure(self, key, err):
+        if self._failure_ttl > 0:
+            self.set(key, CachedFailure(err), ttl=self._failure_ttl)
+
+    def get_or_load(self, key, loader, ttl=None, failures=(Exception,)):
+        """
+        Returns the cached value for key, calling loader() on a miss.
+        Exceptions of the failures types are negatively cached.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            try:
+                value = loader()
+            except failures as err:
+                self.set_failure(key, err)
+                raise
+
+            self.set(key, value, ttl=ttl)
+
+        return value
+
+    def keys(self):
+        """
+        Returns the keys of unexpired entries
+        """
+        now = time()
+        with self._lock:
+            return [key for key, (expires, value) in self._entries.items()
+                    if expires > now]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)
+            }
@@ -0,0 +1,71 @@
+from events.cache import TTLCache
+from events.loader import course_sis_ids
+from restclients.models.canvas import CanvasEnrollment
+from threading import Lock
+
+
+class EnrollmentCoalescer(object):
+    """
+    Drops enrollment events superseded by a newer event for the same
+    (UWRegID, section, role)
+
+    Within a batch only the event add_enrollment would leave in effect
+    is kept.  With a window, events older than one loaded by this
+    worker in the last window seconds are dropped as well.
+    """
+    def __init__(self, window=0, max_size=10000):
+        self._recent = TTLCache(ttl=window, max_size=max_size) if (
+            window > 0) else None
+        self._lock = Lock()
+        self.dropped = 0
+
+    def coalesce(self, enrollments):
+        """
+        Returns the surviving enrollments in their original order
+        """
+        kept = {}
+        dropped = 0
+        for index, enrollment in enumerate(enrollments):
+            key = self._key(enrollment)
+            current = kept.get(key)
+            if current is not None:
+                dropped += 1
+                if not self._supersedes(enrollment,
+                                        self._version(current[1])):
+                    continue
+            elif self._recent:
+                recent = self._recent.get(key)
+                if recent is not None and not self._supersedes(
+                        enrollment, recent):
+                    dropped += 1
+                    continue
+
+            kept[key] = (index, enrollment)
+
+        with self._lock:
+            self.dropped += dropped
+
+        return [enrollment for (index, enrollment) in sorted(
+            kept.values(), key=lambda k: k[0])]
+
+    def record(self, enrollments):
+        """
+        Remembers successfully loaded enrollments for the window
+        """
+        if self._recent:
+            for enrollment in enrollments:
+                self._recent.set(self._key(enrollment),
+                                 self._version(enrollment))
+
+    def _supersedes(self, enrollment, version):
+        (last_modified, status) = version
+        return (enrollment['LastModified'] > last_modified or (
+            enrollment['LastModified'] == last_modified and
+            enrollment['Status'].lower() == CanvasEnrollment.STATUS_ACTIVE))
+
+    def _version(self, enrollment):
+        return (enrollment['LastModified'], enrollment['Status'].lower())
+
+    def _key(self, enrollment):
+        (course_id, primary_course_id) = course_sis_ids(enrollment['Section'])
+        return (enrollment['UWRegID'], course_id, enrollment['Role'])
@@ -2,12 +2,24 @@ from django.http import HttpResponse
 from django.conf import settings
 from logging import getLogger
 from sis_provisioner.views.rest_dispatch import RESTDispatch
-from aws_message.aws import SNS, SNSException
+from aws_message.aws import SNSException
+from events.crypto import CachedSNS
 from events.exceptions import EventException
 from events.enrollment import Enrollment
+from events.spool import enrollment_spool
 import json
 
 
+def payload_settings():
+    """
+    Enrollment processor settings for messages delivered over HTTP
+    """
+    config = dict(settings.AWS_SQS['ENROLLMENT'].get('PAYLOAD_SETTINGS', {}))
+    config['VALIDATE_MSG_SIGNATURE'] = getattr(
+        settings, 'EVENT_VALIDATE_ENROLLMENT_SIGNATURE', True)
+    return config
+
+
 class EnrollmentEvent(RESTDispatch):
     """
     AWS SNS delivered UW Course Registration Event handler
@@ -18,6 +30,7 @@ class EnrollmentEvent(RESTDispatch):
 
     def __init__(self):
         self._topicArn = settings.AWS_SQS['ENROLLMENT']['TOPIC_ARN']
+        self._spool = enrollment_spool()
         self._log = getLogger(__name__)
 
     def POST(self, request, **kwargs):
@@ -25,17 +38,19 @@ class EnrollmentEvent(RESTDispatch):
             aws_msg = json.loads(request.body)
             self._log.info("%s on %s" % (aws_msg['Type'], aws_msg['TopicArn']))
             if aws_msg['TopicArn'] == self._topicArn:
-                aws = SNS(aws_msg)
+                aws = CachedSNS(aws_msg)
 
                 if settings.EVENT_VALIDATE_SNS_SIGNATURE:
                     aws.validate()
 
                 if aws_msg['Type'] == 'Notification':
-                    enrollment = Enrollment(aws.extract())
-
-                    if settings.EVENT_VALIDATE_ENROLLMENT_SIGNATURE:
-                        enrollment.validate()
+                    if self._spool is not None:
+                        # processed later by the drain_enrollments command
+                        self._spool.append(request.body)
+                        return HttpResponse()
 
+                    enrollment = Enrollment(payload_settings(),
+                                            aws.extract())
                     enrollment.process()
                 elif aws_msg['Type'] == 'SubscriptionConfirmation':
                     self._log.info('SubscribeURL: %s' % (
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from events.models import EventCount
+from logging import getLogger
+from threading import Lock, Timer
+from time import time
+from math import floor
+import atexit
+
+
+class EventCounter(object):
+    """
+    Per-process buffer of event counts by (event type, minute)
+
+    Counts are aggregated in memory and written with atomic F()
+    increments by a timer flush_interval seconds after the first
+    unwritten count, and at process exit, so concurrent workers never
+    read-modify-write the same minute row.
+    """
+    def __init__(self, flush_interval=60):
+        self._flush_interval = flush_interval
+        self._counts = {}
+        self._prune_after_day = {}
+        self._lock = Lock()
+        self._timer = None
+        self._log = getLogger(__name__)
+
+    def add(self, event_type, event_count, prune_after_day=7):
+        minute = int(floor(time() / 60))
+        with self._lock:
+            key = (event_type, minute)
+            self._counts[key] = self._counts.get(key, 0) + event_count
+            self._prune_after_day[event_type] = prune_after_day
+            self._schedule()
+
+    def flush(self):
+        with self._lock:
+            counts = self._counts
+            self._counts = {}
+
+        for (event_type, minute), count in counts.items():
+            try:
+                self._increment(event_type, minute, count)
+            except Exception as err:
+                self._log.error('EVENT COUNT flush %s failed: %s' % (
+                    event_type, err))
+                with self._lock:
+                    key = (event_type, minute)
+                    self._counts[key] = self._counts.get(key, 0) + count
+                    self._schedule()
+
+        now = int(floor(time() / 60))
+        for event_type in set(t for (t, m) in counts.keys()):
+            prune = now - self._prune_after_day[event_type] * 24 * 60
+            try:
+                EventCount.objects.filter(event_type=event_type,
+                                          minute__lt=prune).delete()
+            except Exception as err:
+                self._log.error('EVENT COUNT prune %s failed: %s' % (
+                    event_type, err))
+
+    def close(self):
+        """
+        Cancels the pending timed flush and writes buffered counts
+        """
+        with self._lock:
+            timer = self._timer
+            self._timer = None
+
+        if timer is not None:
+            timer.cancel()
+            timer.join()
+
+        self.flush()
+
+    def _schedule(self):
+        # caller holds the lock
+        if self._timer is None:
+            self._timer = Timer(self._flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def _increment(self, event_type, minute, count):
+        counts = EventCount.objects.filter(event_type=event_type,
+                                           minute=minute)
+        if not counts.update(event_count=F('event_count') + count):
+            try:
+                with transaction.atomic():
+                    EventCount.objects.create(
+                        event_type=event_type, minute=minute,
+                        event_count=count)
+            except IntegrityError:
+                # another worker created the row first
+                counts.update(event_count=F('event_count') + count)
+
+
+event_counter = EventCounter(
+    flush_interval=getattr(settings, 'EVENT_COUNT_FLUSH_INTERVAL', 60))
+
+atexit.register(event_counter.close)
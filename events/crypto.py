@@ -0,0 +1,119 @@
+"""
+Process-wide caches in front of aws_message signature verification
+and KWS key resolution
+"""
+from django.conf import settings
+from aws_message.crypto import Signature, CryptoException
+from aws_message.aws import SNS, SNSException
+from events.cache import TTLCache
+from oscrypto import asymmetric as oscrypto_asymmetric
+from oscrypto import errors as oscrypto_errors
+from base64 import b64decode
+
+
+signature_cache = TTLCache(
+    ttl=getattr(settings, 'EVENT_SIGNING_CERT_CACHE_TTL', 3600),
+    max_size=getattr(settings, 'EVENT_SIGNING_CERT_CACHE_SIZE', 16),
+    failure_ttl=getattr(settings, 'EVENT_SIGNING_CERT_FAILURE_TTL', 60))
+
+key_cache = TTLCache(
+    ttl=getattr(settings, 'EVENT_KWS_KEY_CACHE_TTL', 300),
+    max_size=getattr(settings, 'EVENT_KWS_KEY_CACHE_SIZE', 64))
+
+
+class LoadedSignature(Signature):
+    """
+    Signature verifying against a certificate loaded once, rather than
+    parsing the PEM on every validate()
+
+    Raises CryptoException
+    """
+    def __init__(self, config):
+        super(LoadedSignature, self).__init__(config)
+        try:
+            self._certificate = oscrypto_asymmetric.load_certificate(
+                self._cert)
+        except (ValueError, TypeError) as err:
+            raise CryptoException('Cannot load certificate: %s' % err)
+
+    def validate(self, msg, sig):
+        try:
+            oscrypto_asymmetric.rsa_pkcs1v15_verify(
+                self._certificate, sig, msg, 'sha1')
+        except oscrypto_errors.SignatureError as err:
+            raise CryptoException('Cannot validate: %s' % (err))
+
+
+def get_signature(cert_url):
+    """
+    Returns a LoadedSignature verifier for the certificate at cert_url,
+    fetching and loading the certificate only on a cache miss
+
+    Raises CryptoException
+    """
+    def load():
+        return LoadedSignature({
+            'cert': {
+                'type': 'url',
+                'reference': cert_url
+            }
+        })
+
+    return signature_cache.get_or_load(cert_url, load)
+
+
+def key_reference(header):
+    """
+    Returns the key cache reference named by a message header
+    """
+    if 'KeyURL' in header:
+        return ('KeyURL', header['KeyURL'])
+    elif 'KeyId' in header:
+        return ('KeyId', header['KeyId'])
+
+    return ('MessageType', header['MessageType'])
+
+
+def get_key(kws, reference):
+    """
+    Returns decoded AES key bytes for a key_reference, consulting KWS
+    only on a cache miss
+
+    Raises DataFailureException
+    """
+    def load():
+        (ref_type, ref) = reference
+        if ref_type == 'KeyURL':
+            key = kws._key_from_json(kws._get_resource(ref))
+        elif ref_type == 'KeyId':
+            key = kws.get_key(ref)
+        else:
+            key = kws.get_current_key(ref)
+
+        return b64decode(key.key)
+
+    return key_cache.get_or_load(reference, load)
+
+
+def invalidate_key(reference):
+    key_cache.delete(reference)
+
+
+class CachedSNS(SNS):
+    """
+    AWS SNS message validated against the cached signing certificate
+    """
+    def validate(self):
+        t = self._message['SignatureVersion']
+        if t != '1':
+            raise SNSException('Unknown SNS Signature Version: ' + t)
+
+        try:
+            get_signature(self._message['SigningCertURL']).validate(
+                self._signText(), b64decode(self._message['Signature']))
+        except CryptoException as err:
+            raise SNSException(
+                '%s validation fail: %s' % (self._message['Type'], err))
+        except Exception as err:
+            raise SNSException(
+                'Invalid SNS %s: %s' % (self._message['Type'], err))
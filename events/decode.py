@@ -0,0 +1,68 @@
+"""
+Message payload decoding shared by the event and group extractors
+
+Payload boundaries are located with str.find/rfind rather than a
+substitution over the whole body, and JSON is decoded with the module
+named by EVENT_JSON_BACKEND (e.g. 'ujson' or 'simplejson'), falling
+back to the standard library.
+"""
+from django.conf import settings
+from importlib import import_module
+import xml.etree.ElementTree as ET
+import json
+
+
+def _json_backend(name):
+    try:
+        return import_module(name)
+    except ImportError:
+        return json
+
+
+json_backend = _json_backend(getattr(settings, 'EVENT_JSON_BACKEND', 'json'))
+
+_json_decoder = json.JSONDecoder()
+
+
+def decode_json(body):
+    """
+    Decodes the outermost JSON object in body, ignoring any leading
+    cruft or trailing padding
+
+    Raises ValueError
+    """
+    start = body.find('{')
+    end = body.rfind('}') + 1
+    if start < 0 or end <= start:
+        raise ValueError('No JSON object in message body')
+
+    if json_backend is json:
+        # decode in place, rejecting anything but whitespace between the
+        # object and the last brace, as loads(body[start:end]) would
+        (obj, obj_end) = _json_decoder.raw_decode(body, start)
+        if body[obj_end:end].strip():
+            raise ValueError('Extra data after JSON object')
+
+        return obj
+
+    return json_backend.loads(
+        body if (start == 0 and end == len(body)) else body[start:end])
+
+
+def xml_payload(body):
+    """
+    Returns body trimmed to its outermost markup
+    """
+    start = body.find('<')
+    end = body.rfind('>') + 1
+    if start < 0 or end <= start:
+        raise ValueError('No XML document in message body')
+
+    return body if (start == 0 and end == len(body)) else body[start:end]
+
+
+def decode_xml(body):
+    """
+    Parses body as XML, returning the root Element
+    """
+    return ET.fromstring(xml_payload(body))
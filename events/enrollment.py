@@ -1,5 +1,8 @@
+from django.conf import settings
 from events.event import EventBase
-from events.models import EnrollmentLog
+from events.cache import TTLCache
+from events.coalesce import EnrollmentCoalescer
+from events.models import EventCount
 from events.exceptions import EventException, UnhandledActionCodeException
 from restclients.models.sws import Term, Section
 from restclients.models.canvas import CanvasEnrollment
@@ -8,6 +11,16 @@ from dateutil.parser import parse as date_parse
 
 log_prefix = 'ENROLLMENT:'
 
+# Sections and their Terms are shared across events and messages, and
+# must be treated as read-only; sections memoize their derived course
+# ids (see events.loader.course_sis_ids)
+section_cache = TTLCache(
+    ttl=getattr(settings, 'EVENT_SECTION_CACHE_TTL', 3600),
+    max_size=getattr(settings, 'EVENT_SECTION_CACHE_SIZE', 2048))
+
+coalescer = EnrollmentCoalescer(
+    window=getattr(settings, 'EVENT_ENROLLMENT_COALESCE_WINDOW', 0))
+
 
 class Enrollment(EventBase):
     """
@@ -30,29 +43,7 @@ class Enrollment(EventBase):
     def process_events(self, events):
         enrollments = []
         for event in events['Events']:
-            section_data = event['Section']
-            course_data = section_data['Course']
-
-            section = Section()
-            section.term = Term(quarter=course_data['Quarter'],
-                                year=course_data['Year'])
-            section.curriculum_abbr = course_data['CurriculumAbbreviation']
-            section.course_number = course_data['CourseNumber']
-            section.section_id = section_data['SectionID']
-            section.is_primary_section = True
-            section.linked_section_urls = []
-
-            if ('PrimarySection' in event and
-                    'Course' in event['PrimarySection']):
-                primary_course = event['PrimarySection']['Course']
-                if primary_course:
-                    section.is_primary_section = False
-                    section.primary_section_curriculum_abbr = \
-                        primary_course['CurriculumAbbreviation']
-                    section.primary_section_course_number = \
-                        primary_course['CourseNumber']
-                    section.primary_section_id = \
-                        event['PrimarySection']['SectionID']
+            section = self._section(event)
 
             try:
                 data = {
@@ -81,10 +72,63 @@ class Enrollment(EventBase):
                     event['LastModified']))
                 pass
 
-        self.load_enrollments(enrollments)
+        coalesced = coalescer.coalesce(enrollments)
+        if len(coalesced) < len(enrollments):
+            self._log.debug('%s COALESCED %s of %s events' % (
+                log_prefix, len(enrollments) - len(coalesced),
+                len(enrollments)))
+
+        self.load_enrollments(coalesced)
+        coalescer.record(coalesced)
+
+    def _section(self, event):
+        """
+        Returns the shared Section described by an event
+        """
+        section_data = event['Section']
+        course_data = section_data['Course']
+        primary_section = None
+        if ('PrimarySection' in event and
+                'Course' in event['PrimarySection']):
+            primary_course = event['PrimarySection']['Course']
+            if primary_course:
+                primary_section = (
+                    primary_course['CurriculumAbbreviation'],
+                    primary_course['CourseNumber'],
+                    event['PrimarySection']['SectionID'])
+
+        key = (course_data['Year'], course_data['Quarter'],
+               course_data['CurriculumAbbreviation'],
+               course_data['CourseNumber'], section_data['SectionID'],
+               primary_section)
+        return section_cache.get_or_load(key, lambda: self._new_section(key))
+
+    def _new_section(self, key):
+        (year, quarter, curriculum_abbr, course_number, section_id,
+         primary_section) = key
+
+        section = Section()
+        section.term = section_cache.get_or_load(
+            (year, quarter), lambda: Term(quarter=quarter, year=year))
+        section.curriculum_abbr = curriculum_abbr
+        section.course_number = course_number
+        section.section_id = section_id
+        section.is_primary_section = True
+        section.linked_section_urls = []
+
+        if primary_section is not None:
+            section.is_primary_section = False
+            (section.primary_section_curriculum_abbr,
+             section.primary_section_course_number,
+             section.primary_section_id) = primary_section
+
+        return section
+
+    def event_keys(self, events):
+        return [event['Person']['UWRegID'] for event in events['Events']]
 
     def record_success(self, event_count):
-        self.record_success_to_log(EnrollmentLog, event_count)
+        self.record_success_to_log(EventCount.ENROLLMENT, event_count)
 
     def _enrollment_status(self, event, section):
         # Canvas "active" corresponds to Action codes:
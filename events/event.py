@@ -2,13 +2,16 @@ from logging import getLogger
 from sis_provisioner.models import Enrollment
 from sis_provisioner.cache import RestClientsCache
 from events.exceptions import EventException
+from events.loader import EnrollmentLoader
+from events.counter import event_counter
+from events.decode import decode_json
+from events.idempotency import message_store
 from restclients.kws import KWS
 from restclients.exceptions import DataFailureException
-from aws_message.crypto import aes128cbc, Signature, CryptoException
+from aws_message.crypto import aes128cbc, CryptoException
+from events.crypto import (
+    get_signature, get_key, invalidate_key, key_reference)
 from base64 import b64decode
-from time import time
-from math import floor
-import json
 import re
 
 
@@ -19,6 +22,8 @@ class EventBase(object):
 
     _header = None
     _body = None
+    _events = None
+    _duplicate = None
 
     def __init__(self, settings, message):
         """
@@ -32,7 +37,6 @@ class EventBase(object):
         self._settings = settings
         self._re_guid = re.compile(
             r'^[\da-f]{8}(-[\da-f]{4}){3}-[\da-f]{12}$', re.I)
-        self._re_json_cruft = re.compile(r'[^{]*({.*})[^}]*')
 
         try:
             self._header = message['Header']
@@ -59,15 +63,8 @@ class EventBase(object):
                 + self._header['TimeStamp'] + '\n' \
                 + self._body + '\n'
 
-            sig_conf = {
-                'cert': {
-                    'type': 'url',
-                    'reference': self._header['SigningCertURL']
-                }
-            }
-
-            Signature(sig_conf).validate(to_sign.encode('ascii'),
-                                         b64decode(self._header['Signature']))
+            get_signature(self._header['SigningCertURL']).validate(
+                to_sign.encode('ascii'), b64decode(self._header['Signature']))
         except KeyError as err:
             if len(self._header):
                 raise EventException('Invalid Signature Header: %s' % (err))
@@ -80,8 +77,7 @@ class EventBase(object):
         try:
             if 'Encoding' not in self._header:
                 if isinstance(self._body, basestring):
-                    return(json.loads(
-                        self._re_json_cruft.sub(r'\g<1>', self._body)))
+                    return decode_json(self._body)
                 elif isinstance(self._body, dict):
                     return self._body
                 else:
@@ -95,28 +91,18 @@ class EventBase(object):
             if str(t).lower() != 'aes128cbc':
                 raise EventException('Unsupported algorithm: ' + t)
 
-            key = None
-            if 'KeyURL' in self._header:
-                key = self._kws._key_from_json(
-                    self._kws._get_resource(self._header['KeyURL']))
-            elif 'KeyId' in self._header:
-                key = self._kws.get_key(self._header['KeyId'])
-            else:
-                try:
-                    key = self._kws.get_current_key(
-                        self._header['MessageType'])
-                    if not re.match(r'^\s*{.+}\s*$', self._body):
-                        raise CryptoException()
-                except (ValueError, CryptoException) as err:
-                    RestClientsCache().delete_cached_kws_current_key(
-                        self._header['MessageType'])
-                    key = self._kws.get_current_key(
-                        self._header['MessageType'])
-
-            cipher = aes128cbc(b64decode(key.key),
-                               b64decode(self._header['IV']))
-            body = cipher.decrypt(b64decode(self._body))
-            return(json.loads(self._re_json_cruft.sub(r'\g<1>', body)))
+            reference = key_reference(self._header)
+            try:
+                return self._decrypt(get_key(self._kws, reference))
+            except (ValueError, CryptoException):
+                invalidate_key(reference)
+                if reference[0] != 'MessageType':
+                    raise
+
+                # current key may have rotated since it was cached
+                RestClientsCache().delete_cached_kws_current_key(
+                    self._header['MessageType'])
+                return self._decrypt(get_key(self._kws, reference))
         except KeyError as err:
             self._log.error(
                 "Key Error: %s\nHEADER: %s" % (err, self._header))
@@ -131,18 +117,65 @@ class EventBase(object):
         except Exception as err:
             raise EventException('Cannot read: %s' % (err))
 
+    def _decrypt(self, key):
+        cipher = aes128cbc(key, b64decode(self._header['IV']))
+        body = cipher.decrypt(b64decode(self._body))
+        return decode_json(body)
+
     def process(self):
-        if self._settings.get('VALIDATE_MSG_SIGNATURE', True):
-            self.validate()
+        if self._is_duplicate():
+            self._log.info('IGNORE duplicate message %s' % (
+                self.message_id()))
+            return
+
+        self.process_events(self._validated_events())
+        self.record_processed()
+
+    def message_id(self):
+        return self._header.get('MessageId')
 
-        self.process_events(self.extract())
+    def record_processed(self):
+        message_store.record([self.message_id()])
 
     def process_events(self, events):
         raise EventException('No event processor defined')
 
+    def partition_key(self):
+        """
+        Returns the key whose events must be processed in order, or
+        None if the message carries events for more than one key
+        """
+        if self._is_duplicate():
+            # skipped without validation, so any worker will do
+            return self.message_id()
+
+        keys = set(self.event_keys(self._validated_events()))
+        return keys.pop() if len(keys) == 1 else None
+
+    def event_keys(self, events):
+        return []
+
+    def _is_duplicate(self):
+        if self._duplicate is None:
+            self._duplicate = message_store.seen(self.message_id())
+
+        return self._duplicate
+
+    def _validated_events(self):
+        if self._events is None:
+            if self._settings.get('VALIDATE_MSG_SIGNATURE', True):
+                self.validate()
+
+            self._events = self.extract()
+
+        return self._events
+
     def load_enrollments(self, enrollments):
         enrollment_count = len(enrollments)
         if enrollment_count:
+            if self._settings.get('BULK_LOAD_ENROLLMENTS', True):
+                return self._bulk_load_enrollments(enrollments)
+
             for enrollment in enrollments:
                 try:
                     Enrollment.objects.add_enrollment(enrollment)
@@ -154,18 +187,21 @@ class EventBase(object):
             except:
                 pass
 
-    def record_success_to_log(self, log_model, event_count):
-        minute = int(floor(time() / 60))
+    def _bulk_load_enrollments(self, enrollments):
+        outcomes = EnrollmentLoader().load(enrollments)
+        failed = [o for o in outcomes if o.outcome == EnrollmentLoader.FAILED]
+
         try:
-            e = log_model.objects.get(minute=minute)
-            e.event_count += event_count
-        except log_model.DoesNotExist:
-            e = log_model(minute=minute, event_count=event_count)
-
-        e.save()
-
-        if e.event_count <= 5:
-            limit = self._settings.get(
-                'EVENT_COUNT_PRUNE_AFTER_DAY', 7) * 24 * 60
-            prune = minute - limit
-            log_model.objects.filter(minute__lt=prune).delete()
+            self.record_success(len(outcomes) - len(failed))
+        except:
+            pass
+
+        if len(failed):
+            raise EventException('Load enrollment failed: %s of %s: %s' % (
+                len(failed), len(outcomes), failed[0].error))
+
+        return outcomes
+
+    def record_success_to_log(self, event_type, event_count):
+        event_counter.add(event_type, event_count, self._settings.get(
+            'EVENT_COUNT_PRUNE_AFTER_DAY', 7))
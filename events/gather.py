@@ -0,0 +1,270 @@
+from django.db import connection
+from aws_message.gather import Gather, GatherException
+from aws_message.aws import SNSException
+from events.crypto import CachedSNS
+from threading import Thread, Lock
+from Queue import Queue, Empty
+from time import time
+import json
+
+
+class PartitionedPool(object):
+    """
+    Fixed set of worker threads, each draining its own queue
+
+    Work is routed by hash of a partition key, so items sharing a key
+    run in submission order.  Once an item fails, later items with the
+    same key are skipped so they can be redelivered in order.  Each
+    queue holds at most queue_size items, so submit() blocks rather
+    than holding fetched messages past their visibility timeout.
+    """
+    def __init__(self, workers, handler, queue_size=10):
+        self._handler = handler
+        self._queues = [Queue(maxsize=queue_size) for i in range(workers)]
+        self._failed_keys = set()
+        self._lock = Lock()
+        self.completed = Queue()
+        self.errors = []
+        self._threads = []
+        for queue in self._queues:
+            thread = Thread(target=self._run, args=(queue,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, *args):
+        self._queues[hash(key) % len(self._queues)].put((key, args))
+
+    def join(self):
+        for queue in self._queues:
+            queue.join()
+
+    def shutdown(self):
+        for queue in self._queues:
+            queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, queue):
+        try:
+            while True:
+                item = queue.get()
+                try:
+                    if item is None:
+                        return
+
+                    (key, args) = item
+                    with self._lock:
+                        if key in self._failed_keys:
+                            continue
+
+                    try:
+                        self.completed.put(self._handler(*args))
+                    except Exception as err:
+                        with self._lock:
+                            self._failed_keys.add(key)
+                            self.errors.append(err)
+                finally:
+                    queue.task_done()
+        finally:
+            connection.close()
+
+
+class PartitionedGather(Gather):
+    """
+    Gather that processes messages on a pool of worker threads
+
+    Each processor supplies partition_key(), or a message_key(message)
+    class method, in which case the processor is built on the worker
+    after earlier messages with the same key have been applied.
+    Messages sharing a key are handled in order by the same worker.
+    Messages without a single key are processed inline once the pool
+    has drained.  SQS deletes are issued from the gathering thread.
+
+    Processors with a buffer defer their writes; their messages are
+    deleted only after the buffer is flushed, at most every
+    buffer.window seconds and when gathering ends.
+    """
+    def __init__(self, sqs_settings=None, processor=None, exception=None,
+                 workers=None):
+        super(PartitionedGather, self).__init__(
+            sqs_settings=sqs_settings, processor=processor,
+            exception=exception)
+        self._workers = workers if workers else self._settings.get(
+            'WORKERS', 1)
+        self._buffer = getattr(self._processor, 'buffer', None)
+        self._deferred = []
+        self._deferred_since = None
+
+    def gather_events(self):
+        if self._workers < 2 and self._buffer is None:
+            return super(PartitionedGather, self).gather_events()
+
+        pool = PartitionedPool(
+            max([self._workers, 1]), self._process,
+            queue_size=self._settings.get('WORKER_QUEUE_SIZE', 10))
+        try:
+            to_fetch = self._settings.get('MESSAGE_GATHER_SIZE')
+            while to_fetch > 0 and not len(pool.errors):
+                n = min([to_fetch, 10])
+                msgs = self._queue.get_messages(
+                    num_messages=n,
+                    visibility_timeout=self._settings.get(
+                        'VISIBILITY_TIMEOUT'))
+
+                for msg in msgs:
+                    message = self._message_for(msg)
+                    if message is None:
+                        self._queue.delete_message(msg)
+                        continue
+
+                    (key, processor) = self._route(message)
+                    if key is None:
+                        pool.join()
+                        self._delete_completed(pool)
+                        self._run_inline(msg, message, processor)
+                    else:
+                        pool.submit(key, msg, message, processor)
+
+                self._delete_completed(pool)
+                if len(msgs) < n:
+                    self._log.debug("SQS drained")
+                    break
+
+                to_fetch -= n
+
+            pool.join()
+        except Exception:
+            self._finish(pool, failing=True)
+            raise
+
+        self._finish(pool, failing=len(pool.errors) > 0)
+        if len(pool.errors):
+            raise self._gather_exception(pool.errors[0])
+
+    def _finish(self, pool, failing=False):
+        """
+        Stops the pool and acknowledges what completed.  While another
+        error is on its way out, a failure here is logged instead.
+        """
+        pool.shutdown()
+        try:
+            self._delete_completed(pool, force=True)
+        except Exception as err:
+            if not failing:
+                raise
+
+            self._log.error('Cannot acknowledge completed messages: %s' % (
+                err))
+
+    def _message_for(self, msg):
+        """
+        Returns the event message carried by an SQS message, or None if
+        the message needs no processing
+        """
+        try:
+            sqs_msg = json.loads(msg.get_body())
+            if sqs_msg['TopicArn'] != self._topicArn:
+                self._log.warning(
+                    'Unrecognized TopicARN : ' + sqs_msg['TopicArn'])
+                return None
+
+            raw_message = CachedSNS(sqs_msg)
+            if self._settings.get('VALIDATE_SNS_SIGNATURE', True):
+                raw_message.validate()
+
+            if sqs_msg['Type'] == 'Notification':
+                return raw_message.extract()
+            elif sqs_msg['Type'] == 'SubscriptionConfirmation':
+                self._log.debug('SubscribeURL: ' + sqs_msg['SubscribeURL'])
+        except Exception as err:
+            raise self._gather_exception(err)
+
+        return None
+
+    def _route(self, message):
+        """
+        Returns (partition key, processor) for a message.  Processors
+        that can key a message from its header are built on the worker,
+        once earlier messages with the same key have been applied.
+        """
+        try:
+            message_key = getattr(self._processor, 'message_key', None)
+            if message_key is not None:
+                return (message_key(message), None)
+
+            processor = self._new_processor(message)
+            return (processor.partition_key(), processor)
+        except Exception as err:
+            raise self._gather_exception(err)
+
+    def _new_processor(self, message):
+        return self._processor(
+            self._settings.get('PAYLOAD_SETTINGS', {}), message)
+
+    def _run_inline(self, msg, message, processor):
+        try:
+            self._process(msg, message, processor)
+        except Exception as err:
+            raise self._gather_exception(err)
+
+        self._acknowledge(msg)
+
+    def _process(self, msg, message, processor):
+        if processor is None:
+            processor = self._new_processor(message)
+
+        processor.process()
+        return msg
+
+    def _delete_completed(self, pool, force=False):
+        while True:
+            try:
+                self._acknowledge(pool.completed.get_nowait())
+            except Empty:
+                break
+
+        self._flush_deferred(force=force)
+
+    def _acknowledge(self, msg):
+        if self._buffer is None:
+            self._queue.delete_message(msg)
+        else:
+            if not len(self._deferred):
+                self._deferred_since = time()
+
+            self._deferred.append(msg)
+
+    def _flush_deferred(self, force=False):
+        """
+        Writes buffered changes, then deletes the messages they came from
+        """
+        if not len(self._deferred) or not (
+                force or time() - self._deferred_since >= self._buffer.window):
+            return
+
+        try:
+            self._buffer.flush(self._settings.get('PAYLOAD_SETTINGS', {}))
+        except Exception as err:
+            # undeleted messages are redelivered after visibility timeout
+            self._deferred = []
+            raise self._gather_exception(err)
+
+        for msg in self._deferred:
+            self._queue.delete_message(msg)
+
+        self._deferred = []
+
+    def _gather_exception(self, err):
+        if isinstance(err, GatherException):
+            return err
+        elif isinstance(err, ValueError):
+            return GatherException('JSON : %s' % err)
+        elif isinstance(err, self._exception):
+            return GatherException("MESSAGE: %s" % err)
+        elif isinstance(err, SNSException):
+            return GatherException("SNS: %s" % err)
+
+        self._log.error("Gather Error: %s" % err)
+        return GatherException("ERROR: %s" % err)
@@ -1,12 +1,13 @@
 import json
 from base64 import b64decode
-from time import time
-from math import floor
 import dateutil.parser
 from logging import getLogger
-from events.models import GroupLog
+from events.models import EventCount
+from events.counter import event_counter
 from events.group.dispatch import ImportGroupDispatch, CourseGroupDispatch
 from events.group.dispatch import UWGroupDispatch, Dispatch
+from events.group.cache import expansion_cache
+from events.idempotency import message_store
 from aws_message.extract import ExtractException
 
 
@@ -44,7 +45,8 @@ class Group(object):
             raise GroupException(
                 'Unknown Group Message Version: %s' % header['version'])
 
-        context = json.loads(b64decode(header['messageContext']))
+        self._message_id = header.get('messageId')
+        context = self._message_context(message)
         self._action = context['action']
         self._groupname = context['group']
 
@@ -57,6 +59,13 @@ class Group(object):
                 break
 
     def process(self):
+        if message_store.seen(self._message_id):
+            self._log.info('IGNORE duplicate message %s' % (
+                self._message_id))
+            return
+
+        # cached expansions through this group may no longer hold
+        expansion_cache.invalidate(self._groupname)
         try:
             n = self._dispatch.run(self._action, self._groupname)
             if n:
@@ -64,17 +73,20 @@ class Group(object):
         except ExtractException as err:
             raise GroupException('Cannot process: %s' % (err))
 
-    def _recordSuccess(self, count):
-        minute = int(floor(time() / 60))
-        try:
-            e = GroupLog.objects.get(minute=minute)
-            e.event_count += count
-        except GroupLog.DoesNotExist:
-            e = GroupLog(minute=minute, event_count=count)
+        message_store.record([self._message_id])
 
-        e.save()
+    @classmethod
+    def message_key(cls, message):
+        """
+        Returns the group a message is about, read from its header so
+        dispatchers are only built once earlier messages have run
+        """
+        return cls._message_context(message)['group']
+
+    @staticmethod
+    def _message_context(message):
+        return json.loads(b64decode(message['header']['messageContext']))
 
-        if e.event_count <= 5:
-            prune = minute - (self._settings.get(
-                'EVENT_COUNT_PRUNE_AFTER_DAY', 7) * 24 * 60)
-            GroupLog.objects.filter(minute__lt=prune).delete()
+    def _recordSuccess(self, count):
+        event_counter.add(EventCount.GROUP, count, self._settings.get(
+            'EVENT_COUNT_PRUNE_AFTER_DAY', 7))
@@ -0,0 +1,240 @@
+"""
+Worker-wide caches used by the GWS event dispatchers
+"""
+from django.conf import settings
+from sis_provisioner.dao.user import valid_net_id, valid_gmail_id
+from sis_provisioner.dao.course import valid_academic_section_sis_id
+from sis_provisioner.dao.group import get_effective_members
+from sis_provisioner.exceptions import UserPolicyException
+from sis_provisioner.exceptions import CoursePolicyException
+from sis_provisioner.models import Enrollment as EnrollmentModel
+from sis_provisioner.models import Group as GroupModel
+from sis_provisioner.models import GroupMemberGroup as GroupMemberGroupModel
+from restclients.canvas.enrollments import Enrollments as CanvasEnrollments
+from restclients.exceptions import DataFailureException
+from events.cache import TTLCache
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+identity_cache = TTLCache(
+    ttl=getattr(settings, 'EVENT_IDENTITY_CACHE_TTL', 60 * 60),
+    max_size=getattr(settings, 'EVENT_IDENTITY_CACHE_SIZE', 50000),
+    failure_ttl=getattr(settings, 'EVENT_IDENTITY_FAILURE_TTL', 10 * 60))
+
+roster_cache = TTLCache(
+    ttl=getattr(settings, 'EVENT_ROSTER_CACHE_TTL', 60),
+    max_size=getattr(settings, 'EVENT_ROSTER_CACHE_SIZE', 256))
+
+
+class GroupExpansionCache(object):
+    """
+    get_effective_members results keyed by (group, act_as)
+
+    Each expansion is indexed under every group it traversed, so an
+    event touching any of those groups invalidates it.  Invalidations
+    are numbered; a load that overlaps an invalidation of a group it
+    traversed is returned but not cached.  Index entries for expired
+    or evicted expansions are dropped on a miss, and swept once they
+    outnumber the cache.
+    """
+    def __init__(self, ttl=10 * 60, max_size=1024):
+        self._max_size = max_size
+        self._cache = TTLCache(ttl=ttl, max_size=max_size)
+        self._index = {}
+        self._key_groups = {}
+        self._invalidated = OrderedDict()
+        self._generation = 0
+        self._forgotten = 0
+        self._lock = Lock()
+
+    def get_effective_members(self, group_id, act_as):
+        """
+        Returns (valid, invalid, member_groups) for group_id
+
+        Raises GroupNotFoundException, GroupPolicyException,
+        GroupUnauthorizedException, DataFailureException
+        """
+        key = (group_id, act_as)
+        expansion = self._cache.get(key)
+        if expansion is None:
+            with self._lock:
+                self._unindex(key)
+                generation = self._generation
+
+            expansion = get_effective_members(group_id, act_as=act_as)
+            groups = set([group_id] + list(expansion[2]))
+            with self._lock:
+                if self._is_current(groups, generation):
+                    self._cache.set(key, expansion)
+                    self._key_groups[key] = groups
+                    for g in groups:
+                        self._index.setdefault(g, set()).add(key)
+
+                    if len(self._key_groups) > 2 * self._max_size:
+                        self._sweep()
+
+        return expansion
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._generation += 1
+            self._invalidated.pop(group_id, None)
+            self._invalidated[group_id] = self._generation
+            while len(self._invalidated) > self._max_size:
+                (g, generation) = self._invalidated.popitem(last=False)
+                self._forgotten = generation
+
+            for key in list(self._index.get(group_id, ())):
+                self._unindex(key)
+                self._cache.delete(key)
+
+    def _is_current(self, groups, generation):
+        if generation == self._generation:
+            return True
+
+        if self._forgotten > generation:
+            # overlapping invalidations may no longer be on record
+            return False
+
+        return not any(self._invalidated.get(g, 0) > generation
+                       for g in groups)
+
+    def _unindex(self, key):
+        for g in self._key_groups.pop(key, ()):
+            keys = self._index.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not len(keys):
+                    del self._index[g]
+
+    def _sweep(self):
+        live = set(self._cache.keys())
+        for key in list(self._key_groups):
+            if key not in live:
+                self._unindex(key)
+
+
+expansion_cache = GroupExpansionCache(
+    ttl=getattr(settings, 'EVENT_GROUP_EXPANSION_CACHE_TTL', 10 * 60),
+    max_size=getattr(settings, 'EVENT_GROUP_EXPANSION_CACHE_SIZE', 1024))
+
+
+class TrackedGroupIndex(object):
+    """
+    Worker-local set of group ids held in Group or GroupMemberGroup
+
+    Rows added since the last look are read by pk every refresh
+    seconds and the set is rebuilt every rebuild seconds to drop
+    renamed groups.  Membership is a superset of the tables, so a hit
+    is confirmed against the database while a miss is final.
+    """
+    def __init__(self, refresh=30, rebuild=60 * 60):
+        self._refresh = refresh
+        self._rebuild = rebuild
+        self._group_ids = set()
+        self._last_pk = {}
+        self._refreshed = 0
+        self._rebuilt = 0
+        self._lock = Lock()
+
+    def is_tracked(self, group_id):
+        self._update()
+        return group_id in self._group_ids
+
+    def add(self, group_ids):
+        with self._lock:
+            self._group_ids.update(group_ids)
+
+    def _update(self):
+        now = time()
+        if now - self._refreshed < self._refresh:
+            return
+
+        with self._lock:
+            if now - self._refreshed < self._refresh:
+                return
+
+            if now - self._rebuilt >= self._rebuild:
+                self._group_ids = set()
+                self._last_pk = {}
+                self._rebuilt = now
+
+            for model in [GroupModel, GroupMemberGroupModel]:
+                last_pk = self._last_pk.get(model, 0)
+                for (pk, group_id) in model.objects.filter(
+                        pk__gt=last_pk).values_list('pk', 'group_id'):
+                    self._group_ids.add(group_id)
+                    last_pk = max(last_pk, pk)
+
+                self._last_pk[model] = last_pk
+
+            self._refreshed = now
+
+
+tracked_groups = TrackedGroupIndex(
+    refresh=getattr(settings, 'EVENT_TRACKED_GROUP_REFRESH', 30),
+    rebuild=getattr(settings, 'EVENT_TRACKED_GROUP_REBUILD', 60 * 60))
+
+
+def valid_member_id(member):
+    """
+    Returns the normalized user id for a uwnetid or eppn member
+
+    Raises UserPolicyException
+    """
+    def load():
+        if member.is_uwnetid():
+            valid_net_id(member.name)
+            return member.name
+
+        return valid_gmail_id(member.name)
+
+    return identity_cache.get_or_load(
+        (member.name, member.member_type), load,
+        failures=(UserPolicyException,))
+
+
+class CourseRoster(object):
+    """
+    RegIDs officially enrolled in a course: active provisioned
+    enrollments, and Canvas SIS enrollments fetched on first use
+    """
+    def __init__(self, course_id):
+        self.course_id = course_id
+        self.provisioned = set(EnrollmentModel.objects.filter(
+            course_id__startswith=course_id,
+            status='active').values_list('reg_id', flat=True))
+        self._canvas = None
+
+    def is_enrolled(self, reg_id):
+        return reg_id in self.provisioned or reg_id in self.canvas()
+
+    def canvas(self):
+        if self._canvas is None:
+            try:
+                self._canvas = set(
+                    e.sis_user_id for e in CanvasEnrollments(
+                    ).get_enrollments_for_course_by_sis_id(self.course_id)
+                    if self._is_academic_section(e.sis_section_id))
+            except DataFailureException as err:
+                if err.status == 404:
+                    self._canvas = set()  # No enrollment
+                else:
+                    raise
+
+        return self._canvas
+
+    def _is_academic_section(self, sis_section_id):
+        # ad-hoc and group sections are not official enrollment
+        try:
+            valid_academic_section_sis_id(sis_section_id)
+            return True
+        except CoursePolicyException:
+            return False
+
+
+def get_course_roster(course_id):
+    return roster_cache.get_or_load(
+        course_id, lambda: CourseRoster(course_id), failures=())
@@ -1,13 +1,13 @@
 import re
 import datetime
+from collections import OrderedDict
 from django.conf import settings
 from logging import getLogger
 from django.utils.timezone import utc
-from sis_provisioner.dao.user import valid_net_id, valid_gmail_id
-from sis_provisioner.dao.group import get_effective_members, is_member
+from django.db import transaction
+from sis_provisioner.dao.group import is_member
 from sis_provisioner.dao.course import group_section_sis_id,\
     valid_academic_course_sis_id
-from sis_provisioner.dao.canvas import get_sis_enrollments_for_user_in_course
 from sis_provisioner.exceptions import UserPolicyException,\
     GroupPolicyException, GroupNotFoundException, GroupUnauthorizedException,\
     CoursePolicyException
@@ -15,11 +15,13 @@ from sis_provisioner.models import Group as GroupModel
 from sis_provisioner.models import CourseMember as CourseMemberModel
 from sis_provisioner.models import GroupMemberGroup as GroupMemberGroupModel
 from sis_provisioner.models import User as UserModel
-from sis_provisioner.models import Enrollment as EnrollmentModel
 from sis_provisioner.models import PRIORITY_NONE, PRIORITY_DEFAULT,\
     PRIORITY_HIGH, PRIORITY_IMMEDIATE
 from restclients.exceptions import DataFailureException
-from events.group.extract import ExtractUpdate, ExtractDelete, ExtractChange
+from events.group.extract import ExtractUpdate, ExtractDelete,\
+    ExtractChange, ExtractPutMembers, MemberStream, Member
+from events.group.cache import valid_member_id, get_course_roster,\
+    expansion_cache, tracked_groups
 
 
 log_prefix = 'GROUP:'
@@ -89,9 +91,15 @@ class UWGroupDispatch(Dispatch):
     """
     def __init__(self, config, message):
         super(UWGroupDispatch, self).__init__(config, message)
-        self._valid_members = []
+        self._rows_touched = 0
+        self._has_member_group = {}
+        self._effective_member_names = {}
+        self._reg_ids = {}
 
     def mine(self, group):
+        if not tracked_groups.is_tracked(group):
+            return False
+
         self._groups = GroupModel.objects.filter(group_id=group)
         self._membergroups = GroupMemberGroupModel \
             .objects.filter(group_id=group)
@@ -103,29 +111,145 @@ class UWGroupDispatch(Dispatch):
 
         self._log.info('%s UPDATE membership for %s' % (
             log_prefix, event.group_id))
-        updates = [{
-            'members': event.add_members,
-            'is_deleted': None
-        }, {
-            'members': event.delete_members,
-            'is_deleted': True
-        }]
-
-        for update in updates:
-            for member in update['members']:
-                for group in self._groups:
-                    if not group.is_deleted:
-                        self._update_group(group, member, update['is_deleted'])
-
-                for member_group in self._membergroups:
-                    if not member_group.is_deleted:
-                        for group in GroupModel.objects.filter(
-                                group_id=member_group.root_group_id,
-                                is_deleted__isnull=True):
-                            self._update_group(group, member,
-                                               update['is_deleted'])
-
-        return len(event.add_members) + len(event.delete_members)
+
+        groups = self._root_groups()
+        self._apply_members(groups, event)
+
+        self._log.info('%s UPDATED %s in %s groups: %s rows' % (
+            log_prefix, event.group_id, len(groups), self._rows_touched))
+        return event.member_count
+
+    def put_members(self, group_id):
+        # body contains the complete membership
+        return self._replace_members(
+            'put-members', group_id,
+            ExtractPutMembers(self._settings, self._message).extract())
+
+    def put_group(self, group_id):
+        # body contains the group, membership included if it changed
+        return self._replace_members(
+            'put-group', group_id,
+            ExtractPutMembers(self._settings, self._message).extract())
+
+    def _replace_members(self, action, group_id, event):
+        """
+        Brings each affected (course_id, role) in line with a complete
+        membership, writing only the CourseMember rows that change
+        """
+        if not isinstance(event, MemberStream):
+            # only XML member lists are understood
+            self._log.info('%s IGNORE %s for %s' % (
+                log_prefix, action, group_id))
+            return 0
+
+        self._log.info('%s REPLACE membership for %s' % (
+            log_prefix, event.group_id))
+
+        groups = self._root_groups()
+        members = set()
+        self._apply_members(groups, event, members=members,
+                            changed_only=True)
+
+        if event.has_member_list:
+            for group in groups:
+                self._remove_stale_members(group, members)
+
+        self._log.info('%s REPLACED %s in %s groups: %s rows' % (
+            log_prefix, event.group_id, len(groups), self._rows_touched))
+        return event.member_count
+
+    def _apply_members(self, groups, event, members=None, changed_only=False):
+        """
+        Applies streamed members to groups in document order, in bounded
+        chunks of like (add or delete) updates, collecting member keys
+        """
+        chunk_size = self._settings.get('MEMBER_CHUNK_SIZE', 1000)
+        chunk = []
+        chunk_deleted = None
+        for (is_deleted, member) in event:
+            if len(chunk) and (is_deleted != chunk_deleted or
+                               len(chunk) >= chunk_size):
+                self._update_groups(groups, chunk, chunk_deleted,
+                                    changed_only)
+                chunk = []
+
+            if members is not None:
+                try:
+                    members.add(self._member_key(member))
+                except UserPolicyException:
+                    pass
+
+            chunk_deleted = is_deleted
+            chunk.append(member)
+
+        if len(chunk):
+            self._update_groups(groups, chunk, chunk_deleted, changed_only)
+
+    def _update_groups(self, groups, members, is_deleted, changed_only=False):
+        for group in groups:
+            self._update_group(group, members, is_deleted, changed_only)
+
+    def _remove_stale_members(self, group, members):
+        """
+        Deletes active CourseMember rows absent from the new membership
+        and from every live group provisioning the same course and role
+        """
+        current = self._course_role_members(group)
+        if current is None:
+            self._log.info('%s KEEP stale members of %s as %s' % (
+                log_prefix, group.course_id, group.role))
+            return
+
+        stale = [Member(name, member_type) for (name, member_type) in
+                 CourseMemberModel.objects.filter(
+                     course_id=group.course_id, role=group.role,
+                     is_deleted__isnull=True).values_list(
+                         'name', 'member_type')
+                 if ((name, member_type) not in members and
+                     (name, member_type) not in current)]
+
+        self._update_group_members(group, stale, True, changed_only=True)
+
+    def _course_role_members(self, group):
+        """
+        Returns the member keys of all live groups for the course and
+        role of group, or None if any of them cannot be expanded
+        """
+        current = set()
+        for g in GroupModel.objects.filter(
+                course_id=group.course_id, role=group.role,
+                is_deleted__isnull=True):
+            try:
+                (valid, invalid, member_groups) = \
+                    expansion_cache.get_effective_members(
+                        g.group_id, g.added_by)
+            except (DataFailureException, GroupNotFoundException,
+                    GroupPolicyException, GroupUnauthorizedException) as err:
+                self._log.info('%s MEMBERSHIP %s: %s' % (
+                    log_prefix, g.group_id, err))
+                return None
+
+            for member in valid:
+                try:
+                    current.add(self._member_key(member))
+                except UserPolicyException:
+                    pass
+
+        return current
+
+    def _root_groups(self):
+        """
+        Returns the live groups affected by membership changes to this
+        group: the group itself and the root groups it is nested in
+        """
+        groups = [group for group in self._groups if not group.is_deleted]
+        root_group_ids = set(mg.root_group_id for mg in self._membergroups
+                             if not mg.is_deleted)
+        if len(root_group_ids):
+            groups.extend(GroupModel.objects.filter(
+                group_id__in=root_group_ids, is_deleted__isnull=True))
+
+        return groups
 
     def delete_group(self, group_id):
         event = ExtractDelete(self._settings, self._message).extract()
@@ -169,33 +293,35 @@ class UWGroupDispatch(Dispatch):
         GroupMemberGroupModel.objects \
                              .filter(root_group_id=event.old_name) \
                              .update(root_group_id=event.new_name)
+        tracked_groups.add([event.new_name])
         return 1
 
-    def _update_group(self, group, member, is_deleted):
-        if member.is_group():
-            self._update_group_member_group(group, member.name, is_deleted)
-        elif member.is_uwnetid() or member.is_eppn():
-            try:
-                if member.name not in self._valid_members:
-                    if member.is_uwnetid():
-                        valid_net_id(member.name)
-                    elif member.is_eppn():
-                        valid_gmail_id(member.name)
-                    self._valid_members.append(member.name)
-
-                self._update_group_member(group, member, is_deleted)
-            except UserPolicyException:
-                self._log.info('%s IGNORE invalid user %s' % (
-                    log_prefix, member.name))
-        else:
-            self._log.info('%s IGNORE member type %s (%s)' % (
-                log_prefix, member.member_type, member.name))
+    def _update_group(self, group, members, is_deleted, changed_only=False):
+        users = []
+        for member in members:
+            if member.is_group():
+                self._update_group_member_group(
+                    group, member.name, is_deleted, changed_only)
+            elif member.is_uwnetid() or member.is_eppn():
+                try:
+                    valid_member_id(member)
+                    users.append(member)
+                except UserPolicyException:
+                    self._log.info('%s IGNORE invalid user %s' % (
+                        log_prefix, member.name))
+            else:
+                self._log.info('%s IGNORE member type %s (%s)' % (
+                    log_prefix, member.member_type, member.name))
+
+        self._update_group_members(group, users, is_deleted, changed_only)
 
-    def _update_group_member_group(self, group, member_group, is_deleted):
+    def _update_group_member_group(self, group, member_group, is_deleted,
+                                   changed_only=False):
         try:
             # validity is confirmed by act_as
-            (valid, invalid, member_groups) = get_effective_members(
-                member_group, act_as=group.added_by)
+            (valid, invalid, member_groups) = \
+                expansion_cache.get_effective_members(
+                    member_group, group.added_by)
         except GroupNotFoundException as err:
             GroupMemberGroupModel.objects \
                                  .filter(group_id=member_group) \
@@ -208,62 +334,164 @@ class UWGroupDispatch(Dispatch):
                 log_prefix, group.group_id, err))
             return
 
-        for member in valid:
-            self._update_group_member(group, member, is_deleted)
+        self._update_group_members(group, valid, is_deleted, changed_only)
+
+        self._update_member_groups(
+            group, set([member_group] + member_groups), is_deleted)
+
+        self._has_member_group.pop(group.group_id, None)
+
+    def _update_member_groups(self, group, group_ids, is_deleted):
+        member_groups = GroupMemberGroupModel.objects.filter(
+            root_group_id=group.group_id, group_id__in=group_ids)
+        existing = set(member_groups.values_list('group_id', flat=True))
+        with transaction.atomic():
+            if len(existing):
+                member_groups.update(is_deleted=is_deleted)
+
+            GroupMemberGroupModel.objects.bulk_create([
+                GroupMemberGroupModel(group_id=group_id,
+                                      root_group_id=group.group_id,
+                                      is_deleted=is_deleted)
+                for group_id in group_ids - existing])
+
+        tracked_groups.add(group_ids)
+        self._rows_touched += len(group_ids)
+
+    def _update_group_members(self, group, members, is_deleted,
+                              changed_only=False):
+        """
+        Applies membership changes for one (course_id, role) group with
+        one read of the existing CourseMember rows and batched writes.
+        With changed_only, rows already in the resulting state are left
+        alone rather than requeued.
+        """
+        # validity is assumed if the course model exists
+        users = OrderedDict()
+        for member in members:
+            try:
+                key = self._member_key(member)
+            except UserPolicyException:
+                self._log.info('%s IGNORE invalid user %s' % (
+                    log_prefix, member.name))
+                continue
 
-        for mg in [member_group] + member_groups:
-            (gmg, created) = GroupMemberGroupModel.objects.get_or_create(
-                group_id=mg, root_group_id=group.group_id)
-            gmg.is_deleted = is_deleted
-            gmg.save()
+            if key is not None:
+                users[key] = member
 
-    def _update_group_member(self, group, member, is_deleted):
-        # validity is assumed if the course model exists
+        if not len(users):
+            return
+
+        current = {}
+        duplicates = []
+        for cm in CourseMemberModel.objects.filter(
+                course_id=group.course_id, role=group.role,
+                name__in=set(user_id for (user_id, t) in users)).order_by(
+                    'pk'):
+            key = (cm.name, cm.member_type)
+            if key in current:
+                duplicates.append(cm.pk)
+            else:
+                current[key] = cm
+
+        if not is_deleted:
+            self._user_reg_ids(m.name for m in users.values())
+
+        created = []
+        updated = {}
+        for key, member in users.items():
+            member_deleted = is_deleted
+            if is_deleted:
+                # user in other member groups not deleted
+                if self._user_in_member_group(group, member):
+                    member_deleted = None
+            elif self._user_in_course(group, member):
+                # official student/instructor not added via group
+                member_deleted = True
+
+            cm = current.get(key)
+            if changed_only and cm is not None and (
+                    cm.is_deleted == member_deleted):
+                continue
+
+            if cm is None:
+                created.append(CourseMemberModel(
+                    name=key[0], member_type=key[1],
+                    course_id=group.course_id, role=group.role,
+                    is_deleted=member_deleted, priority=PRIORITY_DEFAULT))
+            else:
+                priority = PRIORITY_DEFAULT if (
+                    not cm.queue_id) else PRIORITY_HIGH
+                updated.setdefault(
+                    (member_deleted, priority), []).append(cm.pk)
+
+            self._log.info('%s %s %s to %s as %s' % (
+                log_prefix, 'DELETED' if member_deleted else 'ACTIVE',
+                key[0], group.course_id, group.role))
+
+        if len(duplicates):
+            self._log.debug('%s MULTIPLE (%s) in %s as %s' % (
+                log_prefix, len(duplicates), group.course_id, group.role))
+
+        with transaction.atomic():
+            if len(duplicates):
+                CourseMemberModel.objects.filter(pk__in=duplicates).delete()
+
+            if len(created):
+                CourseMemberModel.objects.bulk_create(created)
+
+            for (member_deleted, priority), pks in updated.items():
+                CourseMemberModel.objects.filter(pk__in=pks).update(
+                    is_deleted=member_deleted, priority=priority)
+
+        self._rows_touched += len(duplicates) + len(created) + sum(
+            len(pks) for pks in updated.values())
+
+    def _member_key(self, member):
+        """
+        Returns the CourseMember (name, member_type) for a user member,
+        or None for other member types
+
+        Raises UserPolicyException
+        """
         if member.is_uwnetid():
-            user_id = member.name
+            return (member.name, member.member_type)
         elif member.is_eppn():
-            user_id = valid_gmail_id(member.name)
-        else:
-            return
+            return (valid_member_id(member), member.member_type)
 
-        try:
-            (cm, created) = CourseMemberModel.objects.get_or_create(
-                name=user_id, member_type=member.member_type,
-                course_id=group.course_id, role=group.role)
-        except CourseMemberModel.MultipleObjectsReturned:
-            models = CourseMemberModel.objects.filter(
-                name=user_id, member_type=member.member_type,
-                course_id=group.course_id, role=group.role)
-            self._log.debug('%s MULTIPLE (%s): %s in %s as %s' % (
-                log_prefix, len(models), user_id, group.course_id,
-                group.role))
-            cm = models[0]
-            created = False
-            for m in models[1:]:
-                m.delete()
-
-        if is_deleted:
-            # user in other member groups not deleted
-            if self._user_in_member_group(group, member):
-                is_deleted = None
-        elif self._user_in_course(group, member):
-            # official student/instructor not added via group
-            is_deleted = True
-
-        cm.is_deleted = is_deleted
-        cm.priority = PRIORITY_DEFAULT if not cm.queue_id else PRIORITY_HIGH
-        cm.save()
-
-        self._log.info('%s %s %s to %s as %s' % (
-            log_prefix, 'DELETED' if is_deleted else 'ACTIVE',
-            user_id, group.course_id, group.role))
+        return None
 
     def _user_in_member_group(self, group, member):
         if self._has_member_groups(group):
-            return is_member(
-                group.group_id, member.name, act_as=group.added_by)
+            members = self._effective_members(group)
+            if members is None:
+                return is_member(
+                    group.group_id, member.name, act_as=group.added_by)
+
+            return member.name in members
         return False
 
+    def _effective_members(self, group):
+        """
+        Returns the set of effective member names of a root group,
+        fetched once per event, or None if it cannot be expanded
+        """
+        if group.group_id not in self._effective_member_names:
+            try:
+                (valid, invalid, member_groups) = \
+                    expansion_cache.get_effective_members(
+                        group.group_id, group.added_by)
+                members = set(m.name for m in valid)
+            except (DataFailureException, GroupNotFoundException,
+                    GroupPolicyException, GroupUnauthorizedException) as err:
+                self._log.info('%s MEMBERSHIP %s by member: %s' % (
+                    log_prefix, group.group_id, err))
+                members = None
+
+            self._effective_member_names[group.group_id] = members
+
+        return self._effective_member_names[group.group_id]
+
     def _user_in_course(self, group, member):
         # academic course?
         try:
@@ -271,37 +499,37 @@ class UWGroupDispatch(Dispatch):
         except CoursePolicyException:
             return False
 
-        # provisioned to academic section?
-        try:
-            user = UserModel.objects.get(net_id=member.name)
-            EnrollmentModel.objects.get(
-                reg_id=user.reg_id,
-                course_id__startswith=group.course_id,
-                status='active')
-            return True
-        except UserModel.DoesNotExist:
+        # provisioned to academic section or in Canvas SIS enrollments?
+        reg_id = self._user_reg_ids([member.name]).get(member.name)
+        if reg_id is None:
             return False
-        except EnrollmentModel.DoesNotExist:
-            pass
 
-        # inspect Canvas Enrollments
-        try:
-            canvas_enrollments = get_sis_enrollments_for_user_in_course(
-                user.reg_id, group.course_id)
-            if len(canvas_enrollments):
-                return True
-        except DataFailureException as err:
-            if err.status == 404:
-                pass  # No enrollment
-            else:
-                raise
+        return get_course_roster(group.course_id).is_enrolled(reg_id)
 
-        return False
+    def _user_reg_ids(self, net_ids):
+        """
+        Returns a dict of RegIDs by net_id, loading any not yet seen
+        this event with one query
+        """
+        missing = set(net_ids) - set(self._reg_ids.keys())
+        if len(missing):
+            for net_id in missing:
+                self._reg_ids[net_id] = None
+
+            for (net_id, reg_id) in UserModel.objects.filter(
+                    net_id__in=missing).values_list('net_id', 'reg_id'):
+                self._reg_ids[net_id] = reg_id
+
+        return self._reg_ids
 
     def _has_member_groups(self, group):
-        return GroupMemberGroupModel.objects.filter(
-            root_group_id=group.group_id,
-            is_deleted__isnull=True).count() > 0
+        if group.group_id not in self._has_member_group:
+            self._has_member_group[group.group_id] = \
+                GroupMemberGroupModel.objects.filter(
+                    root_group_id=group.group_id,
+                    is_deleted__isnull=True).count() > 0
+
+        return self._has_member_group[group.group_id]
 
 
 class ImportGroupDispatch(Dispatch):
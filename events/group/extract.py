@@ -1,49 +1,170 @@
-import re
-import json
-import xml.etree.ElementTree as ET
 from restclients.models.gws import GroupMember
-from events.models import GroupEvent
+from events.models import GroupEvent, GroupRename
+from events.decode import decode_json, decode_xml, xml_payload
 from aws_message.extract import Extract, ExtractException
+from itertools import chain
+from io import BytesIO
+import xml.etree.ElementTree as ET
+
+
+class Member(object):
+    """
+    Compact group member record
+
+    Duck-types the restclients GroupMember interface used by the
+    dispatchers without the Django model overhead.
+    """
+    __slots__ = ('name', 'member_type')
+
+    def __init__(self, name, member_type):
+        self.name = name
+        self.member_type = member_type
+
+    def is_uwnetid(self):
+        return self.member_type == GroupMember.UWNETID_TYPE
+
+    def is_eppn(self):
+        return self.member_type == GroupMember.EPPN_TYPE
+
+    def is_group(self):
+        return self.member_type == GroupMember.GROUP_TYPE
+
+
+class MemberStream(object):
+    """
+    Streaming group event carrying member lists
+
+    group_id and reg_id are read up front from the root's name and
+    regid children.  Iterating yields (is_deleted, Member) pairs for
+    members directly inside the root's member lists, in document order,
+    while the parsed elements are discarded, so memory stays flat
+    regardless of the number of members.
+    """
+    _member_tags = {}
+    _member_lists = ()
+
+    def __init__(self, body):
+        self.group_id = None
+        self.reg_id = None
+        self.member_count = 0
+        self.has_member_list = False
+        self._events = ET.iterparse(
+            BytesIO(xml_payload(body)), events=('start', 'end'))
+        self._pending = []
+        self._parent = None
+        self._depth = 0
+        for (event, elem) in self._events:
+            if (event == 'start' and self._depth == 2 and
+                    self._parent is not None and
+                    elem.tag in self._member_tags):
+                # members follow the group identity; hold for __iter__
+                self._pending.append((event, elem))
+                break
+
+            self._step(event, elem)
+
+    def __iter__(self):
+        try:
+            for (event, elem) in chain(self._pending, self._events):
+                member = self._step(event, elem)
+                if member is not None:
+                    self.member_count += 1
+                    yield member
+                    self._parent.clear()
+        except ET.ParseError as err:
+            raise ExtractException('Cannot parse: %s' % err)
+        finally:
+            self._pending = []
 
+    def _step(self, event, elem):
+        """
+        Tracks the position of elem, returning the (is_deleted, Member)
+        pair for a member element it ends, otherwise None
+        """
+        if event == 'start':
+            self._depth += 1
+            if self._depth == 2 and elem.tag in self._member_lists:
+                self._parent = elem
+                self.has_member_list = True
+
+            return None
+
+        self._depth -= 1
+        if self._depth == 1:
+            # elem is a direct child of the root
+            if elem is self._parent:
+                self._parent = None
+            elif elem.tag == 'name' and self.group_id is None:
+                self.group_id = elem.text
+            elif elem.tag == 'regid' and self.reg_id is None:
+                self.reg_id = elem.text
+        elif (self._depth == 2 and self._parent is not None and
+                elem.tag in self._member_tags):
+            return (self._member_tags[elem.tag],
+                    Member(elem.text, elem.attrib['type']))
+
+        return None
+
+
+class MemberUpdates(MemberStream):
+    """
+    Streaming 'update-members' event
+    """
+    _member_tags = {
+        'add-member': None,
+        'delete-member': True
+    }
+    _member_lists = ('add-members', 'delete-members')
+
+
+class MemberList(MemberStream):
+    """
+    Streaming 'put-members' or 'put-group' event
+
+    Only member elements of the root's members list are course members.
+    has_member_list is only meaningful once the stream is consumed.
+    """
+    _member_tags = {
+        'member': None
+    }
+    _member_lists = ('members',)
+
+
+class ExtractMembers(Extract):
+    _stream = None
 
-class ExtractUpdate(Extract):
     def parse(self, content_type, body):
-        # normalize 'update-members' event
         if content_type == 'xml':
-            rx = re.compile(r'^(<.*>)[^>]*$')
-            root = ET.fromstring(rx.sub(r'\g<1>', body))
-            event = GroupEvent(group_id=root.findall('./name')[0].text,
-                               reg_id=root.findall('./regid')[0].text)
-            event.add_members = [
-                GroupMember(
-                    name=m.text, member_type=m.attrib['type'])
-                for m in root.findall('./add-members/add-member')
-            ]
-            event.delete_members = [
-                GroupMember(
-                    name=m.text, member_type=m.attrib['type'])
-                for m in root.findall('./delete-members/delete-member')
-            ]
-            return event
+            try:
+                return self._stream(body)
+            except ET.ParseError as err:
+                raise ExtractException('Cannot parse: %s' % err)
         elif content_type == 'json':
-            rx = re.compile(r'[^{]*({.*})[^}]*')
-            return json.loads(rx.sub(r'\g<1>', body))
+            return decode_json(body)
 
         raise ExtractException('Unknown event content-type: %s' % content_type)
 
 
+class ExtractUpdate(ExtractMembers):
+    # normalize 'update-members' event
+    _stream = MemberUpdates
+
+
+class ExtractPutMembers(ExtractMembers):
+    # normalize 'put-members' and 'put-group' events
+    _stream = MemberList
+
+
 class ExtractDelete(Extract):
     def parse(self, content_type, body):
         # body contains group identity information
         # normalize 'delete-group' event
         if content_type == 'xml':
-            rx = re.compile(r'^(<.*>)[^>]*$')
-            root = ET.fromstring(rx.sub(r'\g<1>', body))
+            root = decode_xml(body)
             return GroupEvent(group_id=root.findall('./name')[0].text,
                               reg_id=root.findall('./regid')[0].text)
         elif content_type == 'json':
-            rx = re.compile(r'[^{]*({.*})[^}]*')
-            return json.loads(rx.sub(r'\g<1>', body))
+            return decode_json(body)
 
         raise ExtractException('Unknown delete event content-type: %s' % (
             content_type))
@@ -54,14 +175,12 @@ class ExtractChange(Extract):
         # body contains old and new subject names (id)
         # normalize 'change-subject-name' event
         if content_type == 'xml':
-            rx = re.compile(r'^(<.*>)[^>]*$')
-            root = ET.fromstring(rx.sub(r'\g<1>', body))
+            root = decode_xml(body)
             return GroupRename(
                 old_name=root.findall('./subject/old-name')[0].text,
                 new_name=root.findall('./subject/new-name')[0].text)
         elif content_type == 'json':
-            rx = re.compile(r'[^{]*({.*})[^}]*')
-            return json.loads(rx.sub(r'\g<1>', body))
+            return decode_json(body)
 
         raise ExtractException('Unknown delete event content-type: %s' % (
             content_type))
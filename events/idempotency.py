@@ -0,0 +1,97 @@
+"""
+Store of recently processed message ids
+
+SQS and SNS deliver at least once.  Message ids are recorded once a
+message has been applied, so redelivered copies are dropped before
+they are validated, decrypted or processed again.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from events.models import ProcessedMessage
+from events.cache import TTLCache
+from logging import getLogger
+from threading import Lock
+from time import time
+
+
+class MessageStore(object):
+    """
+    Processed message ids with expiry, held in ProcessedMessage and
+    fronted by a process-local cache
+
+    Expired rows are pruned at most every prune_interval seconds.
+    """
+    def __init__(self, ttl=24 * 60 * 60, max_size=10000,
+                 prune_interval=60 * 60):
+        self._ttl = ttl
+        self._recent = TTLCache(ttl=ttl, max_size=max_size)
+        self._prune_interval = prune_interval
+        self._last_prune = 0
+        self._lock = Lock()
+        self._log = getLogger(__name__)
+
+    def seen(self, message_id):
+        """
+        Returns True if message_id was processed within the ttl
+        """
+        if not message_id:
+            return False
+
+        if self._recent.get(message_id):
+            return True
+
+        return ProcessedMessage.objects.filter(
+            message_id=message_id, expires__gt=int(time())).exists()
+
+    def record(self, message_ids):
+        """
+        Marks message_ids processed with one INSERT.  Ids already on
+        record are left alone unless their record has expired.
+        """
+        message_ids = [m for m in set(message_ids) if m]
+        if not len(message_ids):
+            return
+
+        expires = int(time()) + self._ttl
+        try:
+            with transaction.atomic():
+                ProcessedMessage.objects.bulk_create([
+                    ProcessedMessage(message_id=m, expires=expires)
+                    for m in message_ids])
+        except IntegrityError:
+            for message_id in message_ids:
+                self._record(message_id, expires)
+
+        for message_id in message_ids:
+            self._recent.set(message_id, True)
+
+        self._prune()
+
+    def _record(self, message_id, expires):
+        try:
+            with transaction.atomic():
+                ProcessedMessage.objects.create(
+                    message_id=message_id, expires=expires)
+        except IntegrityError:
+            # already recorded; extend only an expired record
+            ProcessedMessage.objects.filter(
+                message_id=message_id, expires__lte=int(time())).update(
+                    expires=expires)
+
+    def _prune(self):
+        now = time()
+        with self._lock:
+            if now - self._last_prune < self._prune_interval:
+                return
+
+            self._last_prune = now
+
+        try:
+            ProcessedMessage.objects.filter(expires__lte=int(now)).delete()
+        except Exception as err:
+            self._log.error('MESSAGE ID prune failed: %s' % err)
+
+
+message_store = MessageStore(
+    ttl=getattr(settings, 'EVENT_MESSAGE_ID_TTL', 24 * 60 * 60),
+    max_size=getattr(settings, 'EVENT_MESSAGE_ID_CACHE_SIZE', 10000))
@@ -1,14 +1,11 @@
-from sis_provisioner.dao.course import is_time_schedule_construction
-from sis_provisioner.dao.term import (
-    get_term_by_year_and_quarter, get_all_active_terms)
 from events.event import EventBase
-from events.models import InstructorLog
+from events.term import term_cache, tsc_cache
+from events.models import EventCount
 from events.exceptions import EventException
 from restclients.models.sws import Section
 from restclients.models.canvas import CanvasEnrollment
 from restclients.exceptions import DataFailureException
 from dateutil.parser import parse as date_parse
-from datetime import datetime
 
 
 log_prefix = 'INSTRUCTOR:'
@@ -22,6 +19,10 @@ class InstructorEventBase(EventBase):
             event['Current'])
         self._last_modified = date_parse(event['EventDate'])
 
+        reg_ids = self.changed_instructors()
+        if not len(reg_ids):
+            return
+
         section_data = event['Current']
         if not section_data:
             section_data = event['Previous']
@@ -29,18 +30,18 @@ class InstructorEventBase(EventBase):
         course_data = section_data['Course']
 
         try:
-            term = get_term_by_year_and_quarter(
+            term = term_cache.active_term(
                 section_data['Term']['Year'], section_data['Term']['Quarter'])
-            active_terms = get_all_active_terms(datetime.now())
         except DataFailureException as err:
             self._log.info('%s ERROR get term: %s' % (log_prefix, err))
             return
 
-        if term not in active_terms:
+        if term is None:
             self._log.info(
-                '%s IGNORE inactive section %s-%s-%s-%s' % (
+                '%s IGNORE inactive section %s-%s-%s-%s-%s' % (
                     log_prefix,
-                    term.canvas_sis_id(),
+                    section_data['Term']['Year'],
+                    section_data['Term']['Quarter'].lower(),
                     course_data['CurriculumAbbreviation'],
                     course_data['CourseNumber'],
                     section_data['SectionID']))
@@ -54,7 +55,7 @@ class InstructorEventBase(EventBase):
             section_id=section_data['SectionID'],
             is_independent_study=section_data['IndependentStudy'])
 
-        if is_time_schedule_construction(section):
+        if tsc_cache.is_time_schedule_construction(section):
             self._log_tsc_ignore(section.canvas_section_sis_id())
             return
 
@@ -86,8 +87,7 @@ class InstructorEventBase(EventBase):
                 section.is_primary_section = True
                 sections.append(section)
 
-        for section in sections:
-            self.load_instructors(section)
+        self.load_instructors(sections, reg_ids)
 
     def _set_primary_section(self, section, primary_section):
         if primary_section is not None:
@@ -99,25 +99,30 @@ class InstructorEventBase(EventBase):
 
     def enrollments(self, reg_id_list, status, section):
         enrollments = []
-        enrollment_data = {
-            'Section': section,
-            'Role': CanvasEnrollment.TEACHER.replace('Enrollment', ''),
-            'Status': status,
-            'LastModified': self._last_modified,
-            'InstructorUWRegID': None
-        }
+        for reg_id in sorted(reg_id_list):
+            enrollments.append({
+                'Section': section,
+                'Role': CanvasEnrollment.TEACHER.replace('Enrollment', ''),
+                'Status': status,
+                'LastModified': self._last_modified,
+                'UWRegID': reg_id,
+                'InstructorUWRegID': reg_id if (
+                    section.is_independent_study) else None
+            })
 
-        for reg_id in reg_id_list:
-            enrollment_data['UWRegID'] = reg_id
-            enrollment_data['InstructorUWRegID'] = reg_id \
-                if section.is_independent_study else None
+        return enrollments
 
-            enrollments.append(enrollment_data)
+    def load_instructors(self, sections, reg_ids):
+        # one batch for the full (section x instructor) matrix
+        enrollments = []
+        for section in sections:
+            enrollments.extend(self.enrollments(
+                reg_ids, self._instructor_status, section))
 
-        return enrollments
+        self.load_enrollments(enrollments)
 
-    def load_instructors(self, section):
-        raise Exception('No load_instructors method')
+    def changed_instructors(self):
+        raise Exception('No changed_instructors method')
 
     def _instructors_from_section_json(self, section):
         instructors = {}
@@ -140,10 +145,19 @@ class InstructorEventBase(EventBase):
                                 section['SectionID'],
                                 ', '.join(person)))
 
-        return instructors.keys()
+        return set(instructors.keys())
+
+    def event_keys(self, event):
+        section_data = event['Current'] if (
+            event['Current']) else event['Previous']
+        course_data = section_data['Course']
+        return ['%s-%s-%s-%s-%s' % (
+            section_data['Term']['Year'], section_data['Term']['Quarter'],
+            course_data['CurriculumAbbreviation'],
+            course_data['CourseNumber'], section_data['SectionID'])]
 
     def record_success(self, event_count):
-        self.record_success_to_log(InstructorLog, event_count)
+        self.record_success_to_log(EventCount.INSTRUCTOR, event_count)
 
 
 class InstructorAdd(InstructorEventBase):
@@ -157,12 +171,10 @@ class InstructorAdd(InstructorEventBase):
     _eventMessageType = 'uw-instructor-add'
     _eventMessageVersion = '1'
 
-    def load_instructors(self, section):
-        add = [reg_id for reg_id in self._current_instructors
-               if reg_id not in self._previous_instructors]
-        enrollments = self.enrollments(
-            add, CanvasEnrollment.STATUS_ACTIVE, section)
-        self.load_enrollments(enrollments)
+    _instructor_status = CanvasEnrollment.STATUS_ACTIVE
+
+    def changed_instructors(self):
+        return self._current_instructors - self._previous_instructors
 
     def _log_tsc_ignore(self, section_id):
         self._log.info("%s IGNORE add TSC on for %s" % (
@@ -180,12 +192,10 @@ class InstructorDrop(InstructorEventBase):
     _eventMessageType = 'uw-instructor-drop'
     _eventMessageVersion = '1'
 
-    def load_instructors(self, section):
-        drop = [reg_id for reg_id in self._previous_instructors
-                if reg_id not in self._current_instructors]
-        enrollments = self.enrollments(
-            drop, CanvasEnrollment.STATUS_DELETED, section)
-        self.load_enrollments(enrollments)
+    _instructor_status = CanvasEnrollment.STATUS_DELETED
+
+    def changed_instructors(self):
+        return self._previous_instructors - self._current_instructors
 
     def _log_tsc_ignore(self, section_id):
         self._log.info("%s IGNORE drop TSC on for %s" % (
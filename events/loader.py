@@ -0,0 +1,175 @@
+from logging import getLogger
+from collections import namedtuple
+from django.db import transaction, IntegrityError
+from sis_provisioner.models import Enrollment, Course
+from sis_provisioner.models import PRIORITY_DEFAULT, PRIORITY_HIGH
+from restclients.models.canvas import CanvasEnrollment
+
+
+log_prefix = 'ENROLLMENT:'
+
+EnrollmentOutcome = namedtuple('EnrollmentOutcome',
+                               ['enrollment', 'outcome', 'error'])
+
+
+def course_sis_ids(section):
+    """
+    Returns (course_id, primary_course_id) for section, memoized on
+    the section so sections shared through the section cache derive
+    them once
+    """
+    ids = getattr(section, '_course_sis_ids', None)
+    if ids is None:
+        course_id = '-'.join([section.term.canvas_sis_id(),
+                              section.curriculum_abbr.upper(),
+                              section.course_number,
+                              section.section_id.upper()])
+        ids = (course_id, None if (
+            section.is_primary_section) else section.canvas_course_sis_id())
+        section._course_sis_ids = ids
+
+    return ids
+
+
+class EnrollmentLoader(object):
+    """
+    Batched equivalent of Enrollment.objects.add_enrollment
+
+    Existing courses and enrollments for the batch are read with one
+    query each, insert/update decisions are made in memory in batch
+    order, and the resulting writes are applied in one transaction.
+    Rows whose course is missing or not yet provisioned are handed to
+    add_enrollment, which owns course creation and prioritization.
+    """
+    ADDED = 'added'
+    UPDATED = 'updated'
+    IGNORED = 'ignored'
+    DEFERRED = 'deferred'
+    LOADED = 'loaded'
+    FAILED = 'failed'
+
+    _update_fields = ('status', 'last_modified', 'request_date',
+                      'primary_course_id', 'instructor_reg_id', 'priority')
+
+    def __init__(self):
+        self._log = getLogger(__name__)
+
+    def load(self, enrollments):
+        """
+        Loads a list of enrollment dicts as accepted by add_enrollment
+
+        Returns a list of EnrollmentOutcome in input order
+        """
+        rows = [self._row(enrollment) for enrollment in enrollments]
+        if not len(rows):
+            return []
+
+        courses = dict((c.course_id, c) for c in Course.objects.filter(
+            course_id__in=set(r['full_course_id'] for r in rows)))
+
+        current = {}
+        for e in Enrollment.objects.filter(
+                course_id__in=set(r['course_id'] for r in rows),
+                reg_id__in=set(r['reg_id'] for r in rows)):
+            current[(e.course_id, e.reg_id, e.role)] = e
+
+        outcomes = []
+        created = {}
+        updated = {}
+        deferred = []
+        for row in rows:
+            course = courses.get(row['full_course_id'])
+            if course is None or not course.provisioned_date:
+                deferred.append(len(outcomes))
+                outcomes.append(None)
+                continue
+
+            key = (row['course_id'], row['reg_id'], row['role'])
+            enrollment = current.get(key)
+            if enrollment is None:
+                enrollment = Enrollment(
+                    course_id=row['course_id'], reg_id=row['reg_id'],
+                    role=row['role'], status=row['status'],
+                    last_modified=row['last_modified'],
+                    primary_course_id=row['primary_course_id'],
+                    instructor_reg_id=row['instructor_reg_id'])
+                current[key] = created[key] = enrollment
+                outcomes.append(self._outcome(row, self.ADDED))
+            elif self._supersedes(row, enrollment):
+                enrollment.status = row['status']
+                enrollment.last_modified = row['last_modified']
+                enrollment.request_date = row['request_date']
+                enrollment.primary_course_id = row['primary_course_id']
+                enrollment.instructor_reg_id = row['instructor_reg_id']
+                enrollment.priority = PRIORITY_DEFAULT if (
+                    enrollment.queue_id is None) else PRIORITY_HIGH
+                if key not in created:
+                    updated[key] = enrollment
+
+                outcomes.append(self._outcome(row, self.UPDATED))
+            else:
+                outcomes.append(self._outcome(row, self.IGNORED))
+
+        try:
+            with transaction.atomic():
+                self._write(created.values(), updated.values())
+        except IntegrityError as err:
+            # lost an insert race with another worker: fall back to the
+            # per-row path, which retries on conflict
+            self._log.info('%s BULK conflict, loading by row: %s' % (
+                log_prefix, err))
+            return [self._add_enrollment(row) for row in rows]
+
+        for i in deferred:
+            outcomes[i] = self._add_enrollment(rows[i], self.DEFERRED)
+
+        self._log.debug('%s BULK %s added, %s updated, %s deferred' % (
+            log_prefix, len(created), len(updated), len(deferred)))
+        return outcomes
+
+    def _write(self, created, updated):
+        if len(created):
+            Enrollment.objects.bulk_create(created)
+
+        # one UPDATE per distinct set of new values
+        batches = {}
+        for enrollment in updated:
+            values = tuple(getattr(enrollment, f) for f in self._update_fields)
+            batches.setdefault(values, []).append(enrollment.pk)
+
+        for values, pks in batches.items():
+            Enrollment.objects.filter(pk__in=pks).update(
+                **dict(zip(self._update_fields, values)))
+
+    def _supersedes(self, row, enrollment):
+        return (row['last_modified'] > enrollment.last_modified or (
+            row['last_modified'] == enrollment.last_modified and
+            row['status'] == CanvasEnrollment.STATUS_ACTIVE))
+
+    def _add_enrollment(self, row, outcome=LOADED):
+        try:
+            Enrollment.objects.add_enrollment(row['enrollment'])
+            return self._outcome(row, outcome)
+        except Exception as err:
+            return self._outcome(row, self.FAILED, err)
+
+    def _outcome(self, row, outcome, error=None):
+        return EnrollmentOutcome(row['enrollment'], outcome, error)
+
+    def _row(self, enrollment):
+        (course_id, primary_course_id) = course_sis_ids(
+            enrollment.get('Section'))
+        instructor_reg_id = enrollment.get('InstructorUWRegID', None)
+        return {
+            'enrollment': enrollment,
+            'course_id': course_id,
+            'full_course_id': '-'.join([course_id, instructor_reg_id]) if (
+                instructor_reg_id is not None) else course_id,
+            'primary_course_id': primary_course_id,
+            'reg_id': enrollment.get('UWRegID'),
+            'role': enrollment.get('Role'),
+            'status': enrollment.get('Status').lower(),
+            'last_modified': enrollment.get('LastModified'),
+            'request_date': enrollment.get('RequestDate'),
+            'instructor_reg_id': instructor_reg_id
+        }
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from events.decode import decode_json, decode_xml, json_backend
+from timeit import timeit
+import xml.etree.ElementTree as ET
+import json
+import re
+
+
+# AES-CBC output carries block padding after the payload
+PADDING = '\x0c' * 12
+
+
+def enrollment_body(event_count):
+    return json.dumps({
+        'EventDate': '2017-01-03T08:00:00.000Z',
+        'Events': [{
+            'Action': {'Code': 'A'},
+            'Auditor': False,
+            'LastModified': '2017-01-03T08:00:00.000Z',
+            'RequestDate': '2017-01-03T07:59:00.000Z',
+            'Person': {
+                'Name': 'STUDENT,JANE',
+                'UWRegID': '%032X' % i
+            },
+            'Section': {
+                'Course': {
+                    'CourseNumber': '142',
+                    'CurriculumAbbreviation': 'CSE',
+                    'Quarter': 'winter',
+                    'Year': 2017
+                },
+                'SectionID': 'A%s' % chr(65 + i % 26)
+            },
+            'PrimarySection': {
+                'Course': {
+                    'CourseNumber': '142',
+                    'CurriculumAbbreviation': 'CSE',
+                    'Quarter': 'winter',
+                    'Year': 2017
+                },
+                'SectionID': 'A'
+            }
+        } for i in range(event_count)]
+    }) + PADDING
+
+
+def group_update_body(member_count):
+    members = ''.join(
+        '<add-member type="uwnetid">user%06d</add-member>' % i
+        for i in range(member_count))
+    return ('<group><name>u_course_cse142_a</name>'
+            '<regid>%032X</regid><add-members>%s</add-members>'
+            '<delete-members/></group>' % (1, members)) + PADDING
+
+
+class Command(BaseCommand):
+    help = "Times message payload decoding against the regex-based path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=200,
+                            help='Events per enrollment message')
+        parser.add_argument('--members', type=int, default=20000,
+                            help='Members per group update message')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Decodes per timing')
+
+    def handle(self, *args, **options):
+        json_cruft = r'[^{]*({.*})[^}]*'
+        xml_cruft = r'^(<.*>)[^>]*$'
+        enrollment = enrollment_body(options['events'])
+        group = group_update_body(options['members'])
+
+        cases = [
+            ('enrollment json, %s events' % options['events'], enrollment,
+             lambda b: json.loads(re.compile(json_cruft).sub(r'\g<1>', b)),
+             decode_json),
+            ('gws xml, %s members' % options['members'], group,
+             lambda b: ET.fromstring(re.compile(xml_cruft).sub(r'\g<1>', b)),
+             decode_xml),
+        ]
+
+        self.stdout.write('json backend: %s' % json_backend.__name__)
+        for (name, body, legacy, current) in cases:
+            legacy_time = timeit(lambda: legacy(body),
+                                 number=options['repeat'])
+            current_time = timeit(lambda: current(body),
+                                  number=options['repeat'])
+            self.stdout.write(
+                '%s (%s bytes): regex %.3f ms, decode %.3f ms' % (
+                    name, len(body),
+                    legacy_time * 1000 / options['repeat'],
+                    current_time * 1000 / options['repeat']))
@@ -0,0 +1,65 @@
+from django.core.management.base import CommandError
+from events.management.commands.load_enrollments import \
+    EnrollmentProvisionerCommand
+from events.consume import payload_settings
+from events.crypto import CachedSNS
+from events.enrollment import Enrollment
+from events.spool import enrollment_spool
+from logging import getLogger
+import json
+
+
+class Command(EnrollmentProvisionerCommand):
+    help = "Processes enrollment events spooled by the SNS endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', type=int, default=100,
+            help='Messages claimed from the spool at a time')
+        parser.add_argument(
+            '--limit', type=int, default=10000,
+            help='Stop after this many messages')
+
+    def handle(self, *args, **options):
+        spool = enrollment_spool()
+        if spool is None:
+            raise CommandError('EVENT_ENROLLMENT_SPOOL is not configured')
+
+        log = getLogger(__name__)
+        config = payload_settings()
+        to_drain = options['limit']
+        failures = 0
+        try:
+            while to_drain > 0:
+                messages = spool.claim(min([to_drain, options['batch']]))
+                if not len(messages):
+                    break
+
+                done = []
+                for (spool_id, message) in messages:
+                    try:
+                        # envelope was verified when it was spooled
+                        Enrollment(config, CachedSNS(
+                            json.loads(message)).extract()).process()
+                        done.append(spool_id)
+                    except Exception as err:
+                        # left leased; claimed again once the lease expires
+                        failures += 1
+                        log.error('ENROLLMENT: spooled %s: %s' % (
+                            spool_id, err))
+
+                spool.complete(done)
+                to_drain -= len(messages)
+
+            self.update_job()
+        except Exception as err:
+            raise CommandError('FAIL: %s' % (err))
+
+        stats = spool.stats()
+        if stats['failed']:
+            self.squawk('%s enrollment messages failed in the spool' % (
+                stats['failed']))
+
+        if failures:
+            raise CommandError('%s spooled messages failed, %s pending' % (
+                failures, stats['pending']))
@@ -1,8 +1,9 @@
 from django.core.management.base import CommandError
 from sis_provisioner.management.commands import SISProvisionerCommand
-from aws_message.gather import Gather, GatherException
+from aws_message.gather import GatherException
+from events.gather import PartitionedGather
 from events.enrollment import Enrollment
-from events.models import EnrollmentLog
+from events.models import EventCount
 from time import time
 from math import floor
 
@@ -12,7 +13,8 @@ class EnrollmentProvisionerCommand(SISProvisionerCommand):
         # squawk if no new events in the last 6 hours
         # TODO: vary acceptability by where we are in the term
         acceptable_silence = (6 * 60)
-        recent = EnrollmentLog.objects.all().order_by('-minute')[:1]
+        recent = EventCount.objects.filter(
+            event_type=EventCount.ENROLLMENT).order_by('-minute')[:1]
         if len(recent):
             delta = int(floor(time() / 60)) - recent[0].minute
             if (delta > acceptable_silence):
@@ -24,9 +26,16 @@ class EnrollmentProvisionerCommand(SISProvisionerCommand):
 class Command(EnrollmentProvisionerCommand):
     help = "Loads enrollment events from SQS"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Process messages on this many partitioned workers')
+
     def handle(self, *args, **options):
         try:
-            Gather(processor=Enrollment).gather_events()
+            PartitionedGather(
+                processor=Enrollment,
+                workers=options['workers']).gather_events()
             self.update_job()
         except GatherException as err:
             raise CommandError(err)
@@ -2,9 +2,10 @@ from django.core.management.base import CommandError
 from django.conf import settings
 from sis_provisioner.management.commands import SISProvisionerCommand
 from sis_provisioner.pidfile import Pidfile, ProcessRunningException
-from aws_message.gather import Gather, GatherException
+from aws_message.gather import GatherException
+from events.gather import PartitionedGather
 from events.group import Group, GroupException
-from events.models import GroupLog
+from events.models import EventCount
 from time import time
 from math import floor
 
@@ -13,7 +14,8 @@ class GroupsProvisionerCommand(SISProvisionerCommand):
     def health_check(self):
         # squawk if no new events in the last 12 hours
         acceptable_silence = (24 * 60)
-        recent = GroupLog.objects.all().order_by('-minute')[:1]
+        recent = EventCount.objects.filter(
+            event_type=EventCount.GROUP).order_by('-minute')[:1]
         if len(recent):
             delta = int(floor(time() / 60)) - recent[0].minute
             if (delta > acceptable_silence):
@@ -25,11 +27,17 @@ class GroupsProvisionerCommand(SISProvisionerCommand):
 class Command(GroupsProvisionerCommand):
     help = "Loads group events from SQS"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Process messages on this many partitioned workers')
+
     def handle(self, *args, **options):
         try:
             with Pidfile():
-                Gather(settings.AWS_SQS.get('GROUP'),
-                       Group, GroupException).gather_events()
+                PartitionedGather(settings.AWS_SQS.get('GROUP'),
+                                  Group, GroupException,
+                                  workers=options['workers']).gather_events()
                 self.update_job()
         except ProcessRunningException as err:
             pass
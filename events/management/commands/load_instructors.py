@@ -1,8 +1,9 @@
 from django.core.management.base import CommandError
 from sis_provisioner.management.commands import SISProvisionerCommand
-from aws_message.gather import Gather, GatherException
+from aws_message.gather import GatherException
+from events.gather import PartitionedGather
 from events.instructor import InstructorAdd, InstructorDrop
-from events.models import InstructorLog
+from events.models import EventCount
 from time import time
 from math import floor
 
@@ -12,7 +13,8 @@ class InstructorProvisionerCommand(SISProvisionerCommand):
         # squawk if no new events in the last 24 hours
         # TODO: vary acceptability by where we are in the term
         acceptable_silence = (24 * 60)
-        recent = InstructorLog.objects.all().order_by('-minute')[:1]
+        recent = EventCount.objects.filter(
+            event_type=EventCount.INSTRUCTOR).order_by('-minute')[:1]
         if len(recent):
             delta = int(floor(time() / 60)) - recent[0].minute
             if (delta > acceptable_silence):
@@ -25,10 +27,19 @@ class InstructorProvisionerCommand(SISProvisionerCommand):
 class Command(InstructorProvisionerCommand):
     help = "Loads enrollment events from SQS"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Process messages on this many partitioned workers')
+
     def handle(self, *args, **options):
         try:
-            Gather(processor=InstructorAdd).gather_events()
-            Gather(processor=InstructorDrop).gather_events()
+            PartitionedGather(
+                processor=InstructorAdd,
+                workers=options['workers']).gather_events()
+            PartitionedGather(
+                processor=InstructorDrop,
+                workers=options['workers']).gather_events()
             self.update_job()
         except GatherException as err:
             raise CommandError(err)
@@ -1,8 +1,9 @@
 from django.core.management.base import CommandError
 from sis_provisioner.management.commands import SISProvisionerCommand
-from aws_message.gather import Gather, GatherException
+from aws_message.gather import GatherException
+from events.gather import PartitionedGather
 from events.person import Person
-from events.models import PersonLog
+from events.models import EventCount
 from time import time
 from math import floor
 
@@ -12,7 +13,8 @@ class PersonChangeCommand(SISProvisionerCommand):
         # squawk if no new events in the last 6 hours
         # TODO: vary acceptability by where we are in the term
         acceptable_silence = (6 * 60)
-        recent = PersonLog.objects.all().order_by('-minute')[:1]
+        recent = EventCount.objects.filter(
+            event_type=EventCount.PERSON).order_by('-minute')[:1]
         if len(recent):
             delta = int(floor(time() / 60)) - recent[0].minute
             if (delta > acceptable_silence):
@@ -24,9 +26,16 @@ class PersonChangeCommand(SISProvisionerCommand):
 class Command(PersonChangeCommand):
     help = "Loads Person change events from SQS"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Process messages on this many partitioned workers')
+
     def handle(self, *args, **options):
         try:
-            Gather(processor=Person).gather_events()
+            PartitionedGather(
+                processor=Person,
+                workers=options['workers']).gather_events()
             self.update_job()
         except GatherException as err:
             raise CommandError(err)
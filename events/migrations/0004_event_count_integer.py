@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_personlog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollmentlog',
+            name='event_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='grouplog',
+            name='event_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='instructorlog',
+            name='event_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='personlog',
+            name='event_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+LOG_MODELS = {
+    'enrollment': 'EnrollmentLog',
+    'group': 'GroupLog',
+    'instructor': 'InstructorLog',
+    'person': 'PersonLog',
+}
+
+
+def copy_event_logs(apps, schema_editor):
+    EventCount = apps.get_model('events', 'EventCount')
+    for event_type, log_model_name in LOG_MODELS.items():
+        counts = {}
+        for log in apps.get_model('events', log_model_name).objects.all():
+            counts[log.minute] = counts.get(log.minute, 0) + log.event_count
+
+        EventCount.objects.bulk_create([
+            EventCount(event_type=event_type, minute=minute,
+                       event_count=count)
+            for minute, count in counts.items()])
+
+
+def restore_event_logs(apps, schema_editor):
+    EventCount = apps.get_model('events', 'EventCount')
+    for event_type, log_model_name in LOG_MODELS.items():
+        LogModel = apps.get_model('events', log_model_name)
+        LogModel.objects.bulk_create([
+            LogModel(minute=c.minute, event_count=c.event_count)
+            for c in EventCount.objects.filter(event_type=event_type)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_count_integer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.SlugField(choices=[('enrollment', 'Enrollment'), ('group', 'Group'), ('instructor', 'Instructor'), ('person', 'Person')], max_length=16)),
+                ('minute', models.IntegerField(db_index=True, default=0)),
+                ('event_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventcount',
+            unique_together=set([('event_type', 'minute')]),
+        ),
+        migrations.RunPython(copy_event_logs, restore_event_logs),
+    ]
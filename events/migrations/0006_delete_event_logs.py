@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_eventcount'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='EnrollmentLog',
+        ),
+        migrations.DeleteModel(
+            name='GroupLog',
+        ),
+        migrations.DeleteModel(
+            name='InstructorLog',
+        ),
+        migrations.DeleteModel(
+            name='PersonLog',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_delete_event_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(max_length=64, unique=True)),
+                ('expires', models.IntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -15,29 +15,31 @@ class GroupRename(models.Model):
     new_name = models.CharField(max_length=256)
 
 
-class EnrollmentLog(models.Model):
-    """ Record Event Frequency
+class EventCount(models.Model):
+    """ Record Event Frequency by event type
     """
-    minute = models.IntegerField(default=0)
-    event_count = models.SmallIntegerField(default=0)
+    ENROLLMENT = 'enrollment'
+    GROUP = 'group'
+    INSTRUCTOR = 'instructor'
+    PERSON = 'person'
 
+    EVENT_TYPE_CHOICES = (
+        (ENROLLMENT, 'Enrollment'),
+        (GROUP, 'Group'),
+        (INSTRUCTOR, 'Instructor'),
+        (PERSON, 'Person'),
+    )
 
-class GroupLog(models.Model):
-    """ Record Event Frequency
-    """
-    minute = models.IntegerField(default=0)
-    event_count = models.SmallIntegerField(default=0)
-
+    event_type = models.SlugField(max_length=16, choices=EVENT_TYPE_CHOICES)
+    minute = models.IntegerField(default=0, db_index=True)
+    event_count = models.IntegerField(default=0)
 
-class InstructorLog(models.Model):
-    """ Record Event Frequency
-    """
-    minute = models.IntegerField(default=0)
-    event_count = models.SmallIntegerField(default=0)
+    class Meta:
+        unique_together = ('event_type', 'minute')
 
 
-class PersonLog(models.Model):
-    """ Record Person Change Event Frequency
+class ProcessedMessage(models.Model):
+    """ Record of a processed message id, kept until it expires
     """
-    minute = models.IntegerField(default=0)
-    event_count = models.SmallIntegerField(default=0)
+    message_id = models.CharField(max_length=64, unique=True)
+    expires = models.IntegerField(db_index=True)
@@ -1,13 +1,163 @@
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Case, When, Value, CharField
 from events.event import EventBase
-from events.models import PersonLog
-from restclients.models.sws import Person as PersonModel
+from events.models import EventCount
+from events.counter import event_counter
+from events.idempotency import message_store
 from sis_provisioner.models import User, PRIORITY_HIGH
 from events.exceptions import EventException
+from collections import OrderedDict
+from logging import getLogger
+from threading import Lock
 
 
 log_prefix = 'PERSON:'
 
 
+class PersonBuffer(object):
+    """
+    Person changes coalesced by RegID until flushed
+
+    Only the latest NetID for each RegID is kept.  A flush matches users
+    by RegID, or by NetID where the RegID changed, raises their priority
+    and writes changed identifiers with one UPDATE, and bulk inserts the
+    rest.  Callers hold their messages until flush() has returned, and
+    their message ids are recorded as processed once it has.
+    """
+    def __init__(self, window=10):
+        self.window = window
+        self._people = OrderedDict()
+        self._message_ids = []
+        self._lock = Lock()
+        self._log = getLogger(__name__)
+
+    def add(self, reg_id, net_id):
+        with self._lock:
+            self._people.pop(reg_id, None)
+            self._people[reg_id] = net_id
+
+    def add_message(self, message_id):
+        with self._lock:
+            self._message_ids.append(message_id)
+
+    def flush(self, config):
+        """
+        Writes buffered changes, returning the number of users queued
+        """
+        with self._lock:
+            people = self._people
+            message_ids = self._message_ids
+            self._people = OrderedDict()
+            self._message_ids = []
+
+        if not len(people):
+            message_store.record(message_ids)
+            return 0
+
+        try:
+            queued = self._queue_bulk(people)
+        except IntegrityError as err:
+            self._log.info('%s BULK queue failed, queueing by row: %s' % (
+                log_prefix, err))
+            queued = None
+
+        if queued is None:
+            queued = self._queue_by_row(people)
+
+        (count, created, changed) = queued
+        self._log.info('%s QUEUED %s users (%s new, %s changed)' % (
+            log_prefix, count, created, changed))
+        event_counter.add(EventCount.PERSON, count, config.get(
+            'EVENT_COUNT_PRUNE_AFTER_DAY', 7))
+        message_store.record(message_ids)
+        return count
+
+    def _queue_bulk(self, people):
+        """
+        Queues people with one read, one UPDATE and one INSERT, returning
+        (queued, created, changed), or None if two people match one user
+        """
+        users = {}
+        by_reg_id = {}
+        by_net_id = {}
+        for (pk, reg_id, net_id) in User.objects.filter(
+                Q(reg_id__in=people.keys()) |
+                Q(net_id__in=set(people.values()))).values_list(
+                    'pk', 'reg_id', 'net_id'):
+            users[pk] = (reg_id, net_id)
+            by_reg_id[reg_id] = pk
+            by_net_id[net_id] = pk
+
+        matched = {}
+        unknown = []
+        for reg_id, net_id in people.items():
+            # an unknown RegID with a known NetID is a RegID change
+            pk = by_reg_id.get(reg_id, by_net_id.get(net_id))
+            if pk is None:
+                unknown.append(reg_id)
+            elif pk in matched:
+                return None
+            else:
+                matched[pk] = (reg_id, net_id)
+
+        changed = [pk for pk in matched if matched[pk] != users[pk]]
+        with transaction.atomic():
+            if len(matched):
+                values = {'priority': PRIORITY_HIGH}
+                for (i, field) in enumerate(['reg_id', 'net_id']):
+                    whens = [When(pk=pk, then=Value(matched[pk][i]))
+                             for pk in changed
+                             if matched[pk][i] != users[pk][i]]
+                    if len(whens):
+                        values[field] = Case(*whens, default=F(field),
+                                             output_field=CharField())
+
+                User.objects.filter(pk__in=matched.keys()).update(**values)
+
+            User.objects.bulk_create([
+                User(reg_id=reg_id, net_id=people[reg_id],
+                     priority=PRIORITY_HIGH) for reg_id in unknown])
+
+        return (len(matched) + len(unknown), len(unknown), len(changed))
+
+    def _queue_by_row(self, people):
+        """
+        Queues people one at a time, in order, returning
+        (queued, created, changed)
+        """
+        queued = created = changed = 0
+        for reg_id, net_id in people.items():
+            try:
+                with transaction.atomic():
+                    user = (User.objects.filter(reg_id=reg_id).first() or
+                            User.objects.filter(net_id=net_id).first())
+                    if user is None:
+                        User.objects.create(reg_id=reg_id, net_id=net_id,
+                                            priority=PRIORITY_HIGH)
+                        created += 1
+                    else:
+                        is_changed = (user.reg_id, user.net_id) != (
+                            reg_id, net_id)
+                        user.reg_id = reg_id
+                        user.net_id = net_id
+                        user.priority = PRIORITY_HIGH
+                        user.save()
+                        changed += 1 if is_changed else 0
+            except IntegrityError as err:
+                self._log.error('%s CANNOT queue %s (%s): %s' % (
+                    log_prefix, reg_id, net_id, err))
+                continue
+
+            queued += 1
+
+        return (queued, created, changed)
+
+
+person_buffer = PersonBuffer(
+    window=getattr(settings, 'EVENT_PERSON_COALESCE_WINDOW', 10))
+
+
 class Person(EventBase):
     """
     Collects Person Change Event described by
@@ -26,6 +176,9 @@ class Person(EventBase):
     _eventMessageType = 'uw-person-change-v1'
     _eventMessageVersion = '1'
 
+    # changes are written when the gatherer flushes the buffer
+    buffer = person_buffer
+
     def process_events(self, event):
         current = event['Current']
         previous = event['Previous']
@@ -44,12 +197,12 @@ class Person(EventBase):
                 current['UWNetID'] != previous['UWNetID'] or
                 current['RegID'] != previous['RegID']):
 
-            user = User.objects.update_priority(
-                PersonModel(uwregid=current['RegID'], uwnetid=net_id),
-                PRIORITY_HIGH)
+            self.buffer.add(current['RegID'], net_id)
 
-            if user is not None:
-                self.record_success(1)
+    def record_processed(self):
+        # recorded once the buffered changes are written
+        self.buffer.add_message(self.message_id())
 
-    def record_success(self, event_count):
-        self.record_success_to_log(PersonLog, event_count)
+    def event_keys(self, event):
+        person = event['Current'] if event['Current'] else event['Previous']
+        return [person['RegID']]
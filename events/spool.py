@@ -0,0 +1,109 @@
+"""
+Durable local spool of received event messages
+
+Messages are appended by the web tier and removed by a drainer once
+processed, so acknowledging a delivery does not wait on downstream
+work.  The spool is a SQLite database in WAL mode, safe for concurrent
+writers across processes.
+"""
+from django.conf import settings
+from time import time
+import sqlite3
+
+
+class MessageSpool(object):
+    """
+    Append-only queue of raw messages with leased claims
+
+    Claimed messages are hidden for lease seconds.  Messages not
+    completed by then are claimed again, up to max_attempts times,
+    after which they are left in the spool for inspection.
+    """
+    def __init__(self, path, lease=300, max_attempts=5):
+        self._path = path
+        self._lease = lease
+        self._max_attempts = max_attempts
+        self._ready = False
+
+    def append(self, message):
+        # sqlite3 rejects non-ASCII byte strings; request bodies are UTF-8
+        if isinstance(message, str):
+            message = message.decode('utf-8')
+
+        self._transact(lambda db: db.execute(
+            'INSERT INTO spool (message, created) VALUES (?, ?)',
+            (message, time())))
+
+    def claim(self, limit):
+        """
+        Returns up to limit (id, message) pairs in arrival order
+        """
+        def claim_rows(db):
+            now = time()
+            rows = db.execute(
+                'SELECT id, message FROM spool WHERE leased_until < ? AND '
+                'attempts < ? ORDER BY id LIMIT ?',
+                (now, self._max_attempts, limit)).fetchall()
+            db.executemany(
+                'UPDATE spool SET leased_until = ?, '
+                'attempts = attempts + 1 WHERE id = ?',
+                [(now + self._lease, row[0]) for row in rows])
+            return rows
+
+        return self._transact(claim_rows)
+
+    def complete(self, ids):
+        if len(ids):
+            self._transact(lambda db: db.executemany(
+                'DELETE FROM spool WHERE id = ?', [(i,) for i in ids]))
+
+    def stats(self):
+        (pending, failed) = self._transact(lambda db: db.execute(
+            'SELECT SUM(attempts < ?), SUM(attempts >= ?) FROM spool',
+            (self._max_attempts, self._max_attempts)).fetchone())
+
+        return {'pending': pending or 0, 'failed': failed or 0}
+
+    def _transact(self, work):
+        # transactions are managed explicitly; IMMEDIATE takes the write
+        # lock up front so concurrent claims cannot overlap
+        db = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+        try:
+            if not self._ready:
+                db.execute('PRAGMA journal_mode=WAL')
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS spool ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'message TEXT NOT NULL, '
+                    'created REAL NOT NULL, '
+                    'attempts INTEGER NOT NULL DEFAULT 0, '
+                    'leased_until REAL NOT NULL DEFAULT 0)')
+                self._ready = True
+
+            db.execute('PRAGMA synchronous=FULL')
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(db)
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+            db.execute('COMMIT')
+            return result
+        finally:
+            db.close()
+
+
+def enrollment_spool():
+    """
+    Returns the enrollment spool, or None if ack-fast mode is off
+    """
+    path = getattr(settings, 'EVENT_ENROLLMENT_SPOOL', None)
+    if not path:
+        return None
+
+    return MessageSpool(
+        path,
+        lease=getattr(settings, 'EVENT_ENROLLMENT_SPOOL_LEASE', 300),
+        max_attempts=getattr(
+            settings, 'EVENT_ENROLLMENT_SPOOL_MAX_ATTEMPTS', 5))
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connection
+from sis_provisioner.dao.term import get_all_active_terms
+from sis_provisioner.dao.course import is_time_schedule_construction
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from logging import getLogger
+from time import time
+
+
+class TermCache(object):
+    """
+    Active terms, cached until the next term transition
+
+    The cached set expires at the earliest upcoming term boundary
+    (first day, last day of instruction, final exams or grade
+    submission deadline) of any active term.  max_ttl caps the expiry
+    in case a boundary is missing.
+    """
+    _boundaries = ('first_day_quarter', 'last_day_instruction',
+                   'last_final_exam_date', 'grade_submission_deadline')
+
+    def __init__(self, max_ttl=24 * 60 * 60):
+        self._max_ttl = max_ttl
+        self._terms = None
+        self._expires = None
+        self._lock = Lock()
+
+    def active_term(self, year, quarter):
+        """
+        Returns the active Term for year and quarter, or None if the
+        term is not active
+
+        Raises DataFailureException
+        """
+        return self._active_terms().get(self._key(year, quarter))
+
+    def invalidate(self):
+        with self._lock:
+            self._terms = None
+
+    def _active_terms(self):
+        now = datetime.now()
+        with self._lock:
+            if self._terms is not None and now < self._expires:
+                return self._terms
+
+        active_terms = get_all_active_terms(now)
+        terms = dict((self._key(t.year, t.quarter), t) for t in active_terms)
+        expires = self._next_transition(active_terms, now)
+        with self._lock:
+            self._terms = terms
+            self._expires = expires
+
+        return terms
+
+    def _next_transition(self, terms, now):
+        transition = now + timedelta(seconds=self._max_ttl)
+        for term in terms:
+            for attr in self._boundaries:
+                boundary = getattr(term, attr, None)
+                if boundary is None:
+                    continue
+
+                if isinstance(boundary, datetime):
+                    boundary = boundary.replace(tzinfo=None)
+                else:
+                    boundary = datetime.combine(boundary, datetime.min.time())
+
+                if now < boundary < transition:
+                    transition = boundary
+
+        return transition
+
+    def _key(self, year, quarter):
+        return (str(year), str(quarter).lower())
+
+
+class TimeScheduleConstructionCache(object):
+    """
+    Time schedule construction status by (campus, term)
+
+    Status younger than refresh seconds is returned as is.  Status
+    younger than stale seconds is returned while a background thread
+    refreshes it.  Older status is refetched inline.
+    """
+    def __init__(self, refresh=60 * 60, stale=6 * 60 * 60):
+        self._refresh = refresh
+        self._stale = stale
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = Lock()
+        self._log = getLogger(__name__)
+
+    def is_time_schedule_construction(self, section):
+        key = self._key(section.course_campus, section.term)
+        revalidate = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                (fetched, status) = entry
+                age = time() - fetched
+                if age < self._refresh:
+                    return status
+
+                if age < self._stale:
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        revalidate = True
+                else:
+                    entry = None
+
+        if entry is None:
+            return self._load(key, section)
+
+        if revalidate:
+            thread = Thread(target=self._revalidate, args=(key, section))
+            thread.daemon = True
+            thread.start()
+
+        return status
+
+    def invalidate(self, course_campus=None, term=None):
+        """
+        Drops cached status for a campus and/or term, or all of it
+        """
+        with self._lock:
+            for key in self._entries.keys():
+                (campus, term_id) = key
+                if ((course_campus is None or
+                        campus == str(course_campus).lower()) and
+                        (term is None or term_id == term.canvas_sis_id())):
+                    del self._entries[key]
+
+    def _load(self, key, section):
+        status = is_time_schedule_construction(section)
+        with self._lock:
+            self._entries[key] = (time(), status)
+
+        return status
+
+    def _revalidate(self, key, section):
+        try:
+            self._load(key, section)
+        except Exception as err:
+            self._log.info('TSC refresh %s failed: %s' % (key, err))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+            connection.close()
+
+    def _key(self, course_campus, term):
+        return (str(course_campus).lower(), term.canvas_sis_id())
+
+
+term_cache = TermCache(
+    max_ttl=getattr(settings, 'EVENT_TERM_CACHE_MAX_TTL', 24 * 60 * 60))
+
+tsc_cache = TimeScheduleConstructionCache(
+    refresh=getattr(settings, 'EVENT_TSC_CACHE_REFRESH', 60 * 60),
+    stale=getattr(settings, 'EVENT_TSC_CACHE_STALE', 6 * 60 * 60))
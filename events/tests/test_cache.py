@@ -0,0 +1,76 @@
+from django.test import TestCase
+from events.cache import TTLCache
+from time import sleep
+
+
+class TTLCacheTest(TestCase):
+    def test_get_set(self):
+        cache = TTLCache()
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.get('a', 0), 0)
+
+        cache.set('a', 1)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertEquals(cache.stats(), {'hits': 1, 'misses': 2, 'size': 1})
+
+        cache.delete('a')
+        self.assertEquals(cache.get('a'), None)
+
+    def test_expiry(self):
+        cache = TTLCache(ttl=0.1)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=60)
+        sleep(0.2)
+
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.get('b'), 2)
+        self.assertEquals(cache.keys(), ['b'])
+
+    def test_least_recently_used_evicted(self):
+        cache = TTLCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEquals(sorted(cache.keys()), ['a', 'c'])
+
+    def test_get_or_load(self):
+        cache = TTLCache()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return 'value'
+
+        self.assertEquals(cache.get_or_load('a', load), 'value')
+        self.assertEquals(cache.get_or_load('a', load), 'value')
+        self.assertEquals(len(loads), 1)
+
+    def test_failure_cached(self):
+        cache = TTLCache(failure_ttl=60)
+        loads = []
+
+        def load():
+            loads.append(1)
+            raise KeyError('failed')
+
+        for i in range(2):
+            self.assertRaises(KeyError, cache.get_or_load, 'a', load)
+
+        self.assertEquals(len(loads), 1)
+
+    def test_failure_not_cached(self):
+        for (cache, failures) in [(TTLCache(), (Exception,)),
+                                  (TTLCache(failure_ttl=60), (ValueError,))]:
+            loads = []
+
+            def load():
+                loads.append(1)
+                raise KeyError('failed')
+
+            for i in range(2):
+                self.assertRaises(KeyError, cache.get_or_load, 'a', load,
+                                  failures=failures)
+
+            self.assertEquals(len(loads), 2)
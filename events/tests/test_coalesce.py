@@ -0,0 +1,82 @@
+from events.coalesce import EnrollmentCoalescer
+from events.tests.utils import EnrollmentStateTestCase, get_enrollment
+from events.tests.utils import ACTIVE, DELETED, REG_ID_1, REG_ID_2
+
+
+class EnrollmentCoalescerTest(EnrollmentStateTestCase):
+    """
+    Coalesced enrollments must leave the rows add_enrollment leaves
+    for the whole batch
+    """
+    def assertCoalescesAsPerRow(self, enrollments, existing=(),
+                                coalescer=None):
+        """
+        Returns the coalesced enrollments, once loading them row by row
+        is shown to leave the rows the whole batch would
+        """
+        if coalescer is None:
+            coalescer = EnrollmentCoalescer()
+
+        def load(enrollments):
+            coalesced = coalescer.coalesce(enrollments)
+            self.add_per_row(coalesced)
+            return coalesced
+
+        return self.assertLoadsAsPerRow(load, enrollments, existing)
+
+    def test_later_event_kept(self):
+        coalesced = self.assertCoalescesAsPerRow([
+            get_enrollment(REG_ID_1, ACTIVE, 1),
+            get_enrollment(REG_ID_1, DELETED, 2),
+        ])
+
+        self.assertEquals(len(coalesced), 1)
+        self.assertEquals(coalesced[0]['Status'], DELETED)
+
+    def test_older_event_dropped(self):
+        coalesced = self.assertCoalescesAsPerRow([
+            get_enrollment(REG_ID_1, DELETED, 5),
+            get_enrollment(REG_ID_1, ACTIVE, 1),
+        ])
+
+        self.assertEquals(len(coalesced), 1)
+        self.assertEquals(coalesced[0]['Status'], DELETED)
+
+    def test_tie_active_wins(self):
+        for statuses in [(ACTIVE, DELETED), (DELETED, ACTIVE)]:
+            coalesced = self.assertCoalescesAsPerRow([
+                get_enrollment(REG_ID_1, status, 1) for status in statuses])
+
+            self.assertEquals(len(coalesced), 1)
+            self.assertEquals(coalesced[0]['Status'], ACTIVE)
+
+    def test_distinct_keys_kept_in_order(self):
+        coalesced = self.assertCoalescesAsPerRow([
+            get_enrollment(REG_ID_2, ACTIVE, 1),
+            get_enrollment(REG_ID_1, ACTIVE, 1),
+            get_enrollment(REG_ID_1, ACTIVE, 1, role='Auditor'),
+            get_enrollment(REG_ID_2, DELETED, 2),
+        ])
+
+        self.assertEquals(
+            [(e['UWRegID'], e['Role'], e['Status']) for e in coalesced], [
+                (REG_ID_1, 'Student', ACTIVE),
+                (REG_ID_1, 'Auditor', ACTIVE),
+                (REG_ID_2, 'Student', DELETED)])
+
+    def test_window(self):
+        loaded = get_enrollment(REG_ID_1, ACTIVE, 5)
+        coalescer = EnrollmentCoalescer(window=60)
+        coalescer.record([loaded])
+
+        coalesced = self.assertCoalescesAsPerRow([
+            get_enrollment(REG_ID_1, DELETED, 1),
+            get_enrollment(REG_ID_1, DELETED, 5),
+        ], existing=[loaded], coalescer=coalescer)
+        self.assertEquals(coalesced, [])
+
+        coalesced = self.assertCoalescesAsPerRow([
+            get_enrollment(REG_ID_1, DELETED, 6),
+        ], existing=[loaded], coalescer=coalescer)
+        self.assertEquals(len(coalesced), 1)
+        self.assertEquals(coalescer.dropped, 2)
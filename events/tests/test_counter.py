@@ -0,0 +1,51 @@
+from django.test import TestCase
+from events.counter import EventCounter
+from events.models import EventCount
+from threading import Event
+from time import time
+from math import floor
+
+
+def counts():
+    return dict((c.event_type, c.event_count)
+                for c in EventCount.objects.all())
+
+
+class EventCounterTest(TestCase):
+    def test_close_increments(self):
+        counter = EventCounter(flush_interval=60)
+        counter.add(EventCount.ENROLLMENT, 2)
+        counter.add(EventCount.ENROLLMENT, 3)
+        counter.add(EventCount.GROUP, 1)
+        self.assertEquals(counts(), {})
+
+        counter.close()
+        self.assertEquals(counts(), {EventCount.ENROLLMENT: 5,
+                                     EventCount.GROUP: 1})
+
+        counter.add(EventCount.ENROLLMENT, 1)
+        counter.close()
+        self.assertEquals(counts()[EventCount.ENROLLMENT], 6)
+
+    def test_flush_prunes(self):
+        now = int(floor(time() / 60))
+        EventCount.objects.create(event_type=EventCount.PERSON,
+                                  minute=now - 3 * 24 * 60, event_count=1)
+
+        counter = EventCounter()
+        counter.add(EventCount.PERSON, 1, prune_after_day=2)
+        counter.close()
+
+        self.assertEquals(list(EventCount.objects.values_list(
+            'minute', 'event_count')), [(now, 1)])
+
+    def test_interval_flush(self):
+        # the timer flushes on its own thread and connection, so only
+        # the call is observed here
+        counter = EventCounter(flush_interval=0.1)
+        flushed = Event()
+        counter.flush = flushed.set
+        self.addCleanup(counter.close)
+
+        counter.add(EventCount.INSTRUCTOR, 4)
+        self.assertTrue(flushed.wait(5))
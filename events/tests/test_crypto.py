@@ -0,0 +1,59 @@
+from django.test import TestCase
+from django.core.cache import cache
+from aws_message.crypto import CryptoException
+from oscrypto import errors as oscrypto_errors
+from events import crypto
+from events.crypto import get_signature, signature_cache
+from hashlib import sha1
+
+
+class FakeAsymmetric(object):
+    """
+    Counts certificate loads; signatures are valid if equal to msg
+    """
+    def __init__(self):
+        self.loads = []
+
+    def load_certificate(self, cert):
+        if cert == 'bad':
+            raise ValueError('not a certificate')
+
+        self.loads.append(cert)
+        return ('loaded', cert)
+
+    def rsa_pkcs1v15_verify(self, certificate, sig, msg, hash_algorithm):
+        if certificate[0] != 'loaded' or sig != msg:
+            raise oscrypto_errors.SignatureError('bad signature')
+
+
+class GetSignatureTest(TestCase):
+    cert_url = 'https://sns.example.com/cert.pem'
+
+    def setUp(self):
+        self.asymmetric = FakeAsymmetric()
+        original = crypto.oscrypto_asymmetric
+        crypto.oscrypto_asymmetric = self.asymmetric
+        self.addCleanup(setattr, crypto, 'oscrypto_asymmetric', original)
+        self.addCleanup(signature_cache.clear)
+        signature_cache.clear()
+
+    def set_cert(self, cert):
+        # Signature consults the django cache before fetching
+        cache.set(sha1(self.cert_url).hexdigest(), cert)
+        self.addCleanup(cache.delete, sha1(self.cert_url).hexdigest())
+
+    def test_certificate_loaded_once(self):
+        self.set_cert('PEM')
+        for i in range(3):
+            get_signature(self.cert_url).validate('msg', 'msg')
+
+        self.assertEquals(self.asymmetric.loads, ['PEM'])
+
+    def test_invalid_signature(self):
+        self.set_cert('PEM')
+        self.assertRaises(CryptoException,
+                          get_signature(self.cert_url).validate, 'msg', 'x')
+
+    def test_bad_certificate(self):
+        self.set_cert('bad')
+        self.assertRaises(CryptoException, get_signature, self.cert_url)
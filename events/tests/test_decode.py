@@ -0,0 +1,54 @@
+from django.test import TestCase
+from events import decode
+from events.decode import decode_json, decode_xml
+import json
+
+
+class LoadsBackend(object):
+    """
+    Stands in for a non-stdlib EVENT_JSON_BACKEND
+    """
+    loads = staticmethod(json.loads)
+
+
+class DecodeJSONTest(TestCase):
+    def backends(self):
+        # yields once per decode path, stdlib first
+        yield
+        backend = decode.json_backend
+        decode.json_backend = LoadsBackend
+        try:
+            yield
+        finally:
+            decode.json_backend = backend
+
+    def assertDecodes(self, body, expected):
+        for _ in self.backends():
+            self.assertEquals(decode_json(body), expected)
+
+    def assertRejects(self, body):
+        for _ in self.backends():
+            self.assertRaises(ValueError, decode_json, body)
+
+    def test_object(self):
+        self.assertDecodes('{"a": 1}', {'a': 1})
+
+    def test_leading_cruft_and_padding(self):
+        self.assertDecodes('\xef\xbb\xbf{"a": [1, 2]}\x04\x04\x04\x04',
+                           {'a': [1, 2]})
+        self.assertDecodes('  {"a": {"b": 2}}  \n', {'a': {'b': 2}})
+
+    def test_trailing_object_rejected(self):
+        self.assertRejects('{"a": 1} junk {"b": 2}')
+        self.assertRejects('{"a": 1}}')
+
+    def test_no_object(self):
+        self.assertRejects('')
+        self.assertRejects('junk')
+        self.assertRejects('} {')
+
+
+class DecodeXMLTest(TestCase):
+    def test_padding(self):
+        root = decode_xml('\n<group><name>u_a</name></group>\x0c\x0c')
+        self.assertEquals(root.findall('./name')[0].text, 'u_a')
@@ -0,0 +1,123 @@
+from django.test import TestCase
+from sis_provisioner.models import Group, CourseMember
+from sis_provisioner.models import PRIORITY_DEFAULT, PRIORITY_HIGH
+from events.group.dispatch import UWGroupDispatch
+from events.group.extract import Member
+from events.group.cache import valid_member_id
+
+
+class StubDispatch(UWGroupDispatch):
+    """
+    Membership checks answered from fixed sets rather than GWS and SWS
+    """
+    in_member_group = set()
+    in_course = set()
+
+    def __init__(self):
+        super(StubDispatch, self).__init__({}, {})
+
+    def _user_in_member_group(self, group, member):
+        return member.name in self.in_member_group
+
+    def _user_in_course(self, group, member):
+        return member.name in self.in_course
+
+
+class PerMemberDispatch(StubDispatch):
+    """
+    The per-member get/save that _update_group_members batches
+    """
+    def _update_group_members(self, group, members, is_deleted,
+                              changed_only=False):
+        for member in members:
+            if member.is_uwnetid():
+                user_id = member.name
+            elif member.is_eppn():
+                user_id = valid_member_id(member)
+            else:
+                continue
+
+            models = list(CourseMember.objects.filter(
+                name=user_id, member_type=member.member_type,
+                course_id=group.course_id, role=group.role).order_by('pk'))
+            if len(models):
+                cm = models[0]
+                for m in models[1:]:
+                    m.delete()
+            else:
+                cm = CourseMember(
+                    name=user_id, member_type=member.member_type,
+                    course_id=group.course_id, role=group.role)
+
+            member_deleted = is_deleted
+            if is_deleted:
+                if self._user_in_member_group(group, member):
+                    member_deleted = None
+            elif self._user_in_course(group, member):
+                member_deleted = True
+
+            cm.is_deleted = member_deleted
+            cm.priority = PRIORITY_DEFAULT if (
+                not cm.queue_id) else PRIORITY_HIGH
+            cm.save()
+
+
+class UpdateGroupMembersTest(TestCase):
+    """
+    _update_group_members must leave the rows the per-member update did
+    """
+    course_id = '2013-spring-TRAIN-100-A'
+    role = 'Student'
+
+    def setUp(self):
+        self.group = Group(group_id='u_test_group', course_id=self.course_id,
+                           role=self.role, added_by='javerage')
+
+    def _reset(self):
+        CourseMember.objects.all().delete()
+        for name, is_deleted, queue_id in [
+                ('existing', None, None),
+                ('queued', True, '1'),
+                ('duplicate', None, None),
+                ('duplicate', True, None)]:
+            CourseMember.objects.create(
+                name=name, member_type='uwnetid', course_id=self.course_id,
+                role=self.role, is_deleted=is_deleted, queue_id=queue_id,
+                priority=PRIORITY_DEFAULT)
+
+    def _state(self):
+        return sorted(CourseMember.objects.values_list(
+            'name', 'member_type', 'course_id', 'role', 'is_deleted',
+            'priority'))
+
+    def assertUpdatesAsPerMember(self, members, is_deleted,
+                                 in_member_group=(), in_course=()):
+        for dispatch_class in [PerMemberDispatch, StubDispatch]:
+            dispatch_class.in_member_group = set(in_member_group)
+            dispatch_class.in_course = set(in_course)
+
+        self._reset()
+        PerMemberDispatch()._update_group_members(
+            self.group, members, is_deleted)
+        expected = self._state()
+
+        self._reset()
+        StubDispatch()._update_group_members(self.group, members, is_deleted)
+        self.assertEquals(self._state(), expected)
+
+    def _members(self, names):
+        return [Member(name, 'uwnetid') for name in names]
+
+    def test_add(self):
+        self.assertUpdatesAsPerMember(
+            self._members(['new', 'existing', 'queued', 'duplicate',
+                           'official', 'new']) + [
+                Member('somebody@gmail.com', 'eppn'),
+                Member('u_other_group', 'group')],
+            None, in_course=['official'])
+
+    def test_delete(self):
+        self.assertUpdatesAsPerMember(
+            self._members(['existing', 'queued', 'duplicate', 'nested',
+                           'absent']),
+            True, in_member_group=['nested', 'existing'])
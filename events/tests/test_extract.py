@@ -0,0 +1,95 @@
+from django.test import TestCase
+from events.group.extract import MemberUpdates, MemberList
+
+
+def member_pairs(stream):
+    return [(is_deleted, member.name, member.member_type)
+            for (is_deleted, member) in stream]
+
+
+class MemberUpdatesTest(TestCase):
+    def test_members(self):
+        stream = MemberUpdates(
+            '<group><name>u_group</name><regid>ABC</regid>'
+            '<add-members>'
+            '<add-member type="uwnetid">javerage</add-member>'
+            '<add-member type="group">u_other</add-member>'
+            '</add-members>'
+            '<delete-members>'
+            '<delete-member type="eppn">j@example.edu</delete-member>'
+            '</delete-members>'
+            '</group>')
+
+        self.assertEquals(stream.group_id, 'u_group')
+        self.assertEquals(stream.reg_id, 'ABC')
+        self.assertEquals(member_pairs(stream), [
+            (None, 'javerage', 'uwnetid'),
+            (None, 'u_other', 'group'),
+            (True, 'j@example.edu', 'eppn'),
+        ])
+        self.assertEquals(stream.member_count, 3)
+        self.assertTrue(stream.has_member_list)
+
+    def test_nested_elements_ignored(self):
+        stream = MemberUpdates(
+            '<group>'
+            '<subject><name>u_wrong</name><regid>XYZ</regid></subject>'
+            '<name>u_group</name><regid>ABC</regid>'
+            '<add-members>'
+            '<add-member type="uwnetid">javerage</add-member>'
+            '<note><add-member type="uwnetid">nested</add-member></note>'
+            '</add-members>'
+            '<history><delete-members>'
+            '<delete-member type="uwnetid">stray</delete-member>'
+            '</delete-members></history>'
+            '</group>')
+
+        self.assertEquals(stream.group_id, 'u_group')
+        self.assertEquals(stream.reg_id, 'ABC')
+        self.assertEquals(member_pairs(stream), [
+            (None, 'javerage', 'uwnetid'),
+        ])
+
+
+class MemberListTest(TestCase):
+    def test_members(self):
+        stream = MemberList(
+            '<group><name>u_group</name><regid>ABC</regid>'
+            '<members>'
+            '<member type="uwnetid">javerage</member>'
+            '<member type="group">u_other</member>'
+            '</members>'
+            '</group>')
+
+        self.assertEquals(member_pairs(stream), [
+            (None, 'javerage', 'uwnetid'),
+            (None, 'u_other', 'group'),
+        ])
+        self.assertTrue(stream.has_member_list)
+
+    def test_non_member_elements_ignored(self):
+        stream = MemberList(
+            '<group><name>u_group</name><regid>ABC</regid>'
+            '<admins><member type="uwnetid">admin</member></admins>'
+            '<members>'
+            '<member type="uwnetid">javerage</member>'
+            '<optouts><member type="uwnetid">optout</member></optouts>'
+            '</members>'
+            '<member type="uwnetid">stray</member>'
+            '</group>')
+
+        self.assertEquals(member_pairs(stream), [
+            (None, 'javerage', 'uwnetid'),
+        ])
+        self.assertEquals(stream.member_count, 1)
+
+    def test_no_member_list(self):
+        stream = MemberList(
+            '<group><name>u_group</name><regid>ABC</regid>'
+            '<admins><members>'
+            '<member type="uwnetid">admin</member>'
+            '</members></admins>'
+            '</group>')
+
+        self.assertEquals(member_pairs(stream), [])
+        self.assertFalse(stream.has_member_list)
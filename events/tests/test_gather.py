@@ -0,0 +1,67 @@
+from django.test import TestCase
+from events.gather import PartitionedPool
+from threading import Event
+
+
+class PartitionedPoolTest(TestCase):
+    def test_key_order(self):
+        applied = []
+
+        def handler(key, i):
+            applied.append((key, i))
+            return i
+
+        pool = PartitionedPool(4, handler)
+        for i in range(50):
+            key = 'key%s' % (i % 5)
+            pool.submit(key, key, i)
+
+        pool.join()
+        pool.shutdown()
+
+        for n in range(5):
+            key = 'key%s' % n
+            self.assertEquals([i for (k, i) in applied if k == key],
+                              range(n, 50, 5))
+
+        completed = []
+        while not pool.completed.empty():
+            completed.append(pool.completed.get())
+
+        self.assertEquals(sorted(completed), range(50))
+        self.assertEquals(pool.errors, [])
+
+    def test_failed_key_skipped(self):
+        applied = []
+        error = ValueError('failed')
+
+        def handler(key, i):
+            if (key, i) == ('bad', 1):
+                raise error
+
+            applied.append((key, i))
+
+        pool = PartitionedPool(2, handler)
+        for (key, i) in [('bad', 0), ('good', 0), ('bad', 1),
+                         ('good', 1), ('bad', 2)]:
+            pool.submit(key, key, i)
+
+        pool.join()
+        pool.shutdown()
+
+        self.assertEquals(sorted(applied),
+                          [('bad', 0), ('good', 0), ('good', 1)])
+        self.assertEquals(pool.errors, [error])
+
+    def test_queue_bounded(self):
+        release = Event()
+        pool = PartitionedPool(1, lambda i: release.wait(), queue_size=1)
+
+        pool.submit('key', 0)
+        pool.submit('key', 1)
+        self.assertTrue(pool._queues[0].full())
+
+        release.set()
+        pool.join()
+        pool.shutdown()
+        self.assertEquals(pool.completed.qsize(), 2)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from events.group import cache
+from events.group.cache import GroupExpansionCache
+
+
+class GroupExpansionCacheTest(TestCase):
+    # group_id: member groups get_effective_members reports
+    member_groups = {
+        'u_root': ['u_child', 'u_grandchild'],
+        'u_child': ['u_grandchild'],
+    }
+
+    def setUp(self):
+        self.loads = []
+        self.expansions = GroupExpansionCache(ttl=60, max_size=4)
+        self.replace_loader(self.get_effective_members)
+
+    def replace_loader(self, loader):
+        original = cache.get_effective_members
+        cache.get_effective_members = loader
+        self.addCleanup(setattr, cache, 'get_effective_members', original)
+
+    def get_effective_members(self, group_id, act_as=None):
+        self.loads.append(group_id)
+        return ([], [], self.member_groups.get(group_id, []))
+
+    def test_cached(self):
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.assertEquals(self.loads, ['u_root'])
+
+        self.expansions.get_effective_members('u_root', 'bill')
+        self.assertEquals(self.loads, ['u_root', 'u_root'])
+
+    def test_invalidated_by_traversed_group(self):
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.expansions.get_effective_members('u_child', 'javerage')
+
+        self.expansions.invalidate('u_grandchild')
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.expansions.get_effective_members('u_child', 'javerage')
+        self.assertEquals(self.loads, ['u_root', 'u_child'] * 2)
+
+        self.expansions.invalidate('u_unrelated')
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.assertEquals(len(self.loads), 4)
+
+    def test_load_raced_by_invalidation_not_cached(self):
+        def racing_load(group_id, act_as=None):
+            self.expansions.invalidate('u_child')
+            return self.get_effective_members(group_id, act_as)
+
+        self.replace_loader(racing_load)
+        self.expansions.get_effective_members('u_root', 'javerage')
+
+        self.replace_loader(self.get_effective_members)
+        self.expansions.get_effective_members('u_root', 'javerage')
+        self.assertEquals(self.loads, ['u_root', 'u_root'])
+
+    def test_index_bounded(self):
+        for i in range(50):
+            self.expansions.get_effective_members('u_group_%s' % i, None)
+
+        self.assertTrue(len(self.expansions._key_groups) <= 8)
+        self.assertTrue(len(self.expansions._index) <= 8)
@@ -0,0 +1,127 @@
+from django.test import TestCase
+from sis_provisioner.models import Enrollment
+from events.loader import EnrollmentLoader, course_sis_ids
+from events.tests.utils import EnrollmentStateTestCase, get_enrollment
+from events.tests.utils import get_section
+from events.tests.utils import BASE_DATE, ACTIVE, DELETED, REG_ID_1, REG_ID_2
+
+
+class LoaderTestCase(EnrollmentStateTestCase):
+    def assertLoads(self, enrollments, existing=(), queued=()):
+        """
+        Returns the loader outcomes for enrollments, once the rows are
+        shown to match add_enrollment applied row by row
+        """
+        outcomes = self.assertLoadsAsPerRow(
+            EnrollmentLoader().load, enrollments, existing, queued)
+        return [o.outcome for o in outcomes]
+
+
+class CourseSISIdsTest(TestCase):
+    def test_primary_section(self):
+        section = get_section('a')
+        self.assertEquals(course_sis_ids(section),
+                          ('2013-spring-TRAIN-100-A', None))
+
+    def test_memoized(self):
+        section = get_section()
+        ids = course_sis_ids(section)
+
+        section.section_id = 'B'
+        self.assertTrue(course_sis_ids(section) is ids)
+
+
+class EnrollmentLoaderTest(LoaderTestCase):
+    def test_insert_and_update_in_one_batch(self):
+        outcomes = self.assertLoads([
+            get_enrollment(REG_ID_2, ACTIVE, 1),
+            get_enrollment(REG_ID_1, DELETED, 2),
+            get_enrollment(REG_ID_2, DELETED, 3),
+        ], existing=[get_enrollment(REG_ID_1, ACTIVE, 0)])
+
+        self.assertEquals(outcomes, [EnrollmentLoader.ADDED,
+                                     EnrollmentLoader.UPDATED,
+                                     EnrollmentLoader.UPDATED])
+
+    def test_older_event_ignored(self):
+        outcomes = self.assertLoads([
+            get_enrollment(REG_ID_1, DELETED, 1),
+        ], existing=[get_enrollment(REG_ID_1, ACTIVE, 5)])
+
+        self.assertEquals(outcomes, [EnrollmentLoader.IGNORED])
+
+    def test_tie_active_wins(self):
+        outcomes = self.assertLoads([
+            get_enrollment(REG_ID_1, ACTIVE, 1),
+            get_enrollment(REG_ID_2, DELETED, 1),
+        ], existing=[get_enrollment(REG_ID_1, DELETED, 1),
+                     get_enrollment(REG_ID_2, ACTIVE, 1)])
+
+        self.assertEquals(outcomes, [EnrollmentLoader.UPDATED,
+                                     EnrollmentLoader.IGNORED])
+
+    def test_queued_update_priority(self):
+        self.assertLoads([
+            get_enrollment(REG_ID_1, DELETED, 2),
+            get_enrollment(REG_ID_2, DELETED, 2),
+        ], existing=[get_enrollment(REG_ID_1, ACTIVE, 1),
+                     get_enrollment(REG_ID_2, ACTIVE, 1)],
+            queued=[REG_ID_1])
+
+
+class EnrollmentLoaderDeferredTest(LoaderTestCase):
+    """
+    Rows for unprovisioned or missing courses go through add_enrollment
+    """
+    courses = {
+        '2013-spring-TRAIN-100-A': BASE_DATE,
+        '2013-spring-TRAIN-100-B': None,
+    }
+
+    def replace_add_enrollment(self, add_enrollment):
+        Enrollment.objects.add_enrollment = add_enrollment
+        self.addCleanup(delattr, Enrollment.objects, 'add_enrollment')
+
+    def test_unprovisioned_course(self):
+        outcomes = self.assertLoads([
+            get_enrollment(REG_ID_1, ACTIVE, 1, section_id='B'),
+            get_enrollment(REG_ID_2, ACTIVE, 1),
+        ])
+
+        self.assertEquals(outcomes, [EnrollmentLoader.DEFERRED,
+                                     EnrollmentLoader.ADDED])
+
+    def test_missing_course(self):
+        self.reset()
+        deferred = []
+        self.replace_add_enrollment(deferred.append)
+
+        missing = get_enrollment(REG_ID_1, ACTIVE, 1, section_id='C')
+        outcomes = EnrollmentLoader().load([
+            missing, get_enrollment(REG_ID_2, ACTIVE, 1)])
+
+        self.assertEquals([o.outcome for o in outcomes], [
+            EnrollmentLoader.DEFERRED, EnrollmentLoader.ADDED])
+        self.assertEquals(deferred, [missing])
+        self.assertEquals(Enrollment.objects.filter(
+            reg_id=REG_ID_2).count(), 1)
+
+    def test_deferred_failure(self):
+        error = Exception('add_enrollment failed')
+
+        def add_enrollment(enrollment):
+            raise error
+
+        self.reset()
+        self.replace_add_enrollment(add_enrollment)
+
+        outcomes = EnrollmentLoader().load([
+            get_enrollment(REG_ID_1, ACTIVE, 1, section_id='C'),
+            get_enrollment(REG_ID_2, ACTIVE, 1)])
+
+        self.assertEquals(
+            [(o.outcome, o.error) for o in outcomes], [
+                (EnrollmentLoader.FAILED, error),
+                (EnrollmentLoader.ADDED, None)])
+        self.assertEquals(Enrollment.objects.filter(
+            reg_id=REG_ID_2).count(), 1)
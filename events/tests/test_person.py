@@ -0,0 +1,53 @@
+from django.test import TestCase
+from sis_provisioner.models import User, PRIORITY_DEFAULT, PRIORITY_HIGH
+from events.person import PersonBuffer
+from events.counter import event_counter
+
+
+class PersonBufferTest(TestCase):
+    def setUp(self):
+        self.addCleanup(event_counter.close)
+        for (reg_id, net_id) in [('REGID_A', 'alice'), ('REGID_B', 'bob'),
+                                 ('REGID_C', 'carol')]:
+            User.objects.create(reg_id=reg_id, net_id=net_id,
+                                priority=PRIORITY_DEFAULT)
+
+    def flush(self, people):
+        buffer = PersonBuffer()
+        for (reg_id, net_id) in people:
+            buffer.add(reg_id, net_id)
+
+        return buffer.flush({})
+
+    def state(self):
+        return sorted(User.objects.values_list(
+            'reg_id', 'net_id', 'priority'))
+
+    def test_queue(self):
+        count = self.flush([
+            ('REGID_A', 'alice2'),
+            ('REGID_B2', 'bob'),
+            ('REGID_C', 'carol'),
+            ('REGID_D', 'dave'),
+        ])
+
+        self.assertEquals(count, 4)
+        self.assertEquals(self.state(), [
+            ('REGID_A', 'alice2', PRIORITY_HIGH),
+            ('REGID_B2', 'bob', PRIORITY_HIGH),
+            ('REGID_C', 'carol', PRIORITY_HIGH),
+            ('REGID_D', 'dave', PRIORITY_HIGH),
+        ])
+
+    def test_netid_moved_between_people(self):
+        count = self.flush([
+            ('REGID_A', 'dave'),
+            ('REGID_C', 'alice'),
+        ])
+
+        self.assertEquals(count, 2)
+        self.assertEquals(self.state(), [
+            ('REGID_A', 'dave', PRIORITY_HIGH),
+            ('REGID_B', 'bob', PRIORITY_DEFAULT),
+            ('REGID_C', 'alice', PRIORITY_HIGH),
+        ])
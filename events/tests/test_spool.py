@@ -0,0 +1,65 @@
+from django.test import TestCase
+from events.spool import MessageSpool
+from tempfile import mkdtemp
+from shutil import rmtree
+from time import sleep
+import sqlite3
+import os
+
+
+class MessageSpoolTest(TestCase):
+    def setUp(self):
+        self.path = mkdtemp()
+        self.spool = MessageSpool(os.path.join(self.path, 'spool.db'))
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def test_claim_in_arrival_order(self):
+        for message in ['{"a": 1}', '{"b": 2}', '{"c": 3}']:
+            self.spool.append(message)
+
+        claimed = self.spool.claim(2)
+        self.assertEquals([m for (i, m) in claimed], ['{"a": 1}', '{"b": 2}'])
+
+        claimed = self.spool.claim(10)
+        self.assertEquals([m for (i, m) in claimed], ['{"c": 3}'])
+        self.assertEquals(self.spool.claim(10), [])
+
+    def test_non_ascii_body(self):
+        # the django sqlite backend registers a str adapter that would
+        # hide byte strings reaching sqlite3 under other databases
+        adapter_key = (str, sqlite3.PrepareProtocol)
+        adapter = sqlite3.adapters.pop(adapter_key, None)
+        try:
+            body = u'{"Subject": "Caf\xe9 \u2603"}'
+            self.spool.append(body.encode('utf-8'))
+
+            ((i, message),) = self.spool.claim(1)
+            self.assertEquals(message, body)
+        finally:
+            if adapter is not None:
+                sqlite3.adapters[adapter_key] = adapter
+
+    def test_complete_removes(self):
+        self.spool.append('{}')
+        self.spool.append('{}')
+        claimed = self.spool.claim(10)
+
+        self.spool.complete([claimed[0][0]])
+        self.assertEquals(self.spool.stats(), {'pending': 1, 'failed': 0})
+
+    def test_expired_lease_reclaimed(self):
+        spool = MessageSpool(
+            os.path.join(self.path, 'lease.db'), lease=0.1, max_attempts=2)
+        spool.append('{}')
+
+        self.assertEquals(len(spool.claim(10)), 1)
+        self.assertEquals(spool.claim(10), [])
+
+        sleep(0.2)
+        self.assertEquals(len(spool.claim(10)), 1)
+
+        sleep(0.2)
+        self.assertEquals(spool.claim(10), [])
+        self.assertEquals(spool.stats(), {'pending': 0, 'failed': 1})
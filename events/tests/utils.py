@@ -0,0 +1,100 @@
+from django.test import TestCase
+from django.utils.timezone import utc
+from sis_provisioner.models import Course, Enrollment
+from restclients.models.sws import Term, Section
+from restclients.models.canvas import CanvasEnrollment
+from datetime import datetime, timedelta
+
+
+BASE_DATE = datetime(2013, 3, 1, 8, 0, 0).replace(tzinfo=utc)
+
+ACTIVE = CanvasEnrollment.STATUS_ACTIVE
+DELETED = CanvasEnrollment.STATUS_DELETED
+
+REG_ID_1 = '9136CCB8F66711D5BE060004AC494FFE'
+REG_ID_2 = 'FE36CCB8F66711D5BE060004AC494F31'
+
+
+def get_section(section_id='A'):
+    section = Section()
+    section.term = Term(quarter='spring', year=2013)
+    section.curriculum_abbr = 'TRAIN'
+    section.course_number = '100'
+    section.section_id = section_id
+    section.is_primary_section = True
+    section.linked_section_urls = []
+    return section
+
+
+def get_enrollment(reg_id, status, minutes, section_id='A', role='Student'):
+    """
+    Returns an enrollment dict as built by Enrollment.process_events,
+    last modified minutes after BASE_DATE
+    """
+    return {
+        'Section': get_section(section_id),
+        'Role': role,
+        'UWRegID': reg_id,
+        'Status': status,
+        'LastModified': BASE_DATE + timedelta(minutes=minutes),
+        'RequestDate': BASE_DATE,
+        'InstructorUWRegID': None
+    }
+
+
+class EnrollmentStateTestCase(TestCase):
+    """
+    Compares Enrollment and Course rows left by different load paths
+    against Enrollment.objects.add_enrollment applied row by row
+    """
+    enrollment_fields = ('course_id', 'reg_id', 'role', 'status',
+                         'last_modified', 'primary_course_id',
+                         'instructor_reg_id', 'priority')
+    course_fields = ('course_id', 'course_type', 'provisioned_date',
+                     'priority')
+
+    # course_id: provisioned_date
+    courses = {
+        '2013-spring-TRAIN-100-A': BASE_DATE,
+    }
+
+    def reset(self, existing=(), queued=()):
+        Enrollment.objects.all().delete()
+        Course.objects.all().delete()
+        for course_id, provisioned_date in self.courses.items():
+            Course.objects.create(
+                course_id=course_id, course_type=Course.SDB_TYPE,
+                term_id='2013-spring', provisioned_date=provisioned_date)
+
+        for enrollment in existing:
+            Enrollment.objects.add_enrollment(enrollment)
+
+        Enrollment.objects.filter(reg_id__in=queued).update(queue_id='1')
+
+    def state(self):
+        return (
+            sorted(Enrollment.objects.values_list(*self.enrollment_fields)),
+            sorted(Course.objects.values_list(*self.course_fields)))
+
+    def add_per_row(self, enrollments):
+        for enrollment in enrollments:
+            try:
+                Enrollment.objects.add_enrollment(enrollment)
+            except Exception:
+                pass
+
+    def assertLoadsAsPerRow(self, load, enrollments, existing=(),
+                            queued=()):
+        """
+        Asserts load(enrollments) leaves the rows add_enrollment leaves
+        applied row by row, returning what load returned
+        """
+        self.reset(existing, queued)
+        self.add_per_row(enrollments)
+        expected = self.state()
+
+        self.reset(existing, queued)
+        loaded = load(enrollments)
+
+        self.assertEquals(self.state(), expected)
+        return loaded
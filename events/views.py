@@ -2,8 +2,9 @@ from time import time, gmtime, strftime
 from calendar import timegm
 from math import floor
 import dateutil.parser
+from django.db.models import ExpressionWrapper, F, IntegerField, Sum
 from sis_provisioner.views.rest_dispatch import RESTDispatch
-from events.models import EnrollmentLog, GroupLog, InstructorLog, PersonLog
+from events.models import EventCount
 import json
 
 
@@ -11,6 +12,13 @@ class EventListView(RESTDispatch):
     """
     Expose ranges of event counts
     """
+    RESOLUTIONS = {
+        'minute': 1,
+        '5min': 5,
+        'hour': 60,
+        'day': 24 * 60
+    }
+
     def GET(self, request, **kwargs):
         try:
             event_types = request.GET.get('type', 'enrollment')
@@ -33,38 +41,46 @@ class EventListView(RESTDispatch):
                             start_sample = end_sample
                             end_sample = t
 
+            resolution = request.GET.get('resolution', 'minute')
+            if resolution not in self.RESOLUTIONS:
+                raise Exception('unknown resolution %s' % resolution)
+
+            interval = self.RESOLUTIONS[resolution]
+            start_sample -= start_sample % interval
+            end_sample -= end_sample % interval
+
+            event_types = event_types.split(',')
+            known_types = [t for (t, name) in EventCount.EVENT_TYPE_CHOICES]
+            for event_type in event_types:
+                if event_type not in known_types:
+                    raise Exception('unknown event type %s' % event_type)
+
             events = {}
-            for event_type in event_types.split(','):
+            for event_type in event_types:
                 events[event_type] = {
                     'start': strftime("%Y-%m-%dT%H:%M:%SZ",
                                       gmtime(start_sample * 60)),
                     'end': strftime("%Y-%m-%dT%H:%M:%SZ",
                                     gmtime(end_sample * 60)),
+                    'resolution': resolution,
                     'points': [0 for i in xrange(
-                        (end_sample - start_sample + 1))]
+                        (end_sample - start_sample) / interval + 1)]
                 }
 
-                if event_type == 'enrollment':
-                    event_log = EnrollmentLog.objects.filter(
-                        minute__gte=start_sample)
-                elif event_type == 'instructor':
-                    event_log = InstructorLog.objects.filter(
-                        minute__gte=start_sample)
-                elif event_type == 'group':
-                    event_log = GroupLog.objects.filter(
-                        minute__gte=start_sample)
-                elif event_type == 'person':
-                    event_log = PersonLog.objects.filter(
-                        minute__gte=start_sample)
-                else:
-                    raise Exception('unknown event type %s' % event_type)
+            # sum counts into interval-aligned buckets in the database
+            bucket = ExpressionWrapper(
+                F('minute') - F('minute') % interval,
+                output_field=IntegerField())
+            samples = EventCount.objects.filter(
+                event_type__in=event_types,
+                minute__gte=start_sample,
+                minute__lt=end_sample + interval).annotate(
+                    bucket=bucket).values('event_type', 'bucket').annotate(
+                        total=Sum('event_count'))
 
-                for o in event_log:
-                    try:
-                        events[event_type]['points'][
-                            o.minute - start_sample] = o.event_count
-                    except:
-                        pass
+            for o in samples:
+                events[o['event_type']]['points'][
+                    (o['bucket'] - start_sample) / interval] = o['total']
 
             return self.json_response(json.dumps(events))
         except Exception as err: